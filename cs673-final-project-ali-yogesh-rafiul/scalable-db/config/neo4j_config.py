@@ -2,33 +2,104 @@
 Neo4j Database Configuration
 """
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+# Batch Processing Settings (rows per UNWIND transaction, override with NEO4J_BATCH_SIZE)
+BATCH_SIZE = 10000
 
-# Neo4j Connection Settings
-NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-NEO4J_USERNAME = os.getenv("NEO4J_USERNAME", "neo4j")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password")
-NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "healthproject")
+# Rows per server-side transaction inside a node batch, 0 to disable
+# (CALL ... IN TRANSACTIONS, override with NEO4J_SERVER_BATCH_SIZE)
+SERVER_BATCH_SIZE = 0
 
-# Batch Processing Settings
-BATCH_SIZE = 1000
+# Concurrent load sessions (override with NEO4J_LOAD_WORKERS, 1 loads serially)
+LOAD_WORKERS = 8
+
+# Concurrent read sessions for the fraud queries and aggregations (override with NEO4J_QUERY_WORKERS, 1 runs them in order)
+QUERY_WORKERS = 8
+
+# Query result files: "csv", or "parquet" for zstd-compressed Parquet (override with NEO4J_RESULTS_FORMAT)
+RESULTS_FORMAT = "csv"
+
+# Print each query's Cypher and its first 10 results, not just the columns and row count
+# (override with NEO4J_VERBOSE_RESULTS)
+VERBOSE_RESULTS = False
+
+# Reuse saved statistics and aggregation results while the graph is unchanged, i.e. its last
+# committed transaction ID is the same (override with NEO4J_RESULT_CACHE)
+RESULT_CACHE = True
+
+# Have the server write the aggregation CSVs with apoc.export.csv.query instead of fetching the
+# rows (needs APOC file export and the server's import directory mounted as outputs/results,
+# override with NEO4J_APOC_EXPORT)
+USE_APOC_EXPORT = False
+
+# Bulk loads over the HTTP transactional API instead of Bolt (override with NEO4J_HTTP_BULK)
+USE_HTTP_BULK = False
+
+# Send batches as one list per column instead of one map per row (override with NEO4J_COLUMNAR_PAYLOAD)
+COLUMNAR_PAYLOAD = False
+
+# Create relationships server-side with apoc.periodic.iterate from staged rows
+# (needs the APOC plugin, override with NEO4J_APOC_ITERATE)
+USE_APOC_ITERATE = False
+
+# Create FILED/HAS_CLAIM while loading the Claim nodes (override with NEO4J_FUSE_CLAIM_RELATIONSHIPS)
+FUSE_CLAIM_RELATIONSHIPS = False
 
 # Timeout Settings (in seconds)
 CONNECTION_TIMEOUT = 30
 QUERY_TIMEOUT = 300
 
-def get_neo4j_config():
-    """Return Neo4j configuration dictionary"""
+# Driver connection pool, which must hold every concurrent load/query session
+# (override with NEO4J_MAX_POOL_SIZE), and how long a session waits for a free connection
+MAX_CONNECTION_POOL_SIZE = 100
+CONNECTION_ACQUISITION_TIMEOUT = 60
+
+# Records fetched per round-trip when streaming query results (override with NEO4J_FETCH_SIZE)
+FETCH_SIZE = 5000
+
+@lru_cache(maxsize=1)
+def load_environment():
+    """Load environment variables from .env once per process"""
+    load_dotenv()
+    return True
+
+@lru_cache(maxsize=1)
+def resolve_neo4j_config():
+    """Resolve Neo4j connection settings from the environment once per process"""
+    load_environment()
     return {
-        "uri": NEO4J_URI,
-        "user": NEO4J_USERNAME,
-        "password": NEO4J_PASSWORD,
-        "database": NEO4J_DATABASE,
-        "batch_size": BATCH_SIZE,
+        "uri": os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+        "http_uri": os.getenv("NEO4J_HTTP_URI", "http://localhost:7474"),
+        "user": os.getenv("NEO4J_USERNAME", "neo4j"),
+        "password": os.getenv("NEO4J_PASSWORD", "password"),
+        "database": os.getenv("NEO4J_DATABASE", "healthproject"),
+        "batch_size": int(os.getenv("NEO4J_BATCH_SIZE", BATCH_SIZE)),
+        "server_batch_size": int(os.getenv("NEO4J_SERVER_BATCH_SIZE", SERVER_BATCH_SIZE)),
+        "load_workers": int(os.getenv("NEO4J_LOAD_WORKERS", LOAD_WORKERS)),
+        "query_workers": int(os.getenv("NEO4J_QUERY_WORKERS", QUERY_WORKERS)),
+        "results_format": os.getenv("NEO4J_RESULTS_FORMAT", RESULTS_FORMAT).lower(),
+        "verbose_results": os.getenv("NEO4J_VERBOSE_RESULTS", str(VERBOSE_RESULTS)).lower() in ("1", "true", "yes"),
+        "result_cache": os.getenv("NEO4J_RESULT_CACHE", str(RESULT_CACHE)).lower() in ("1", "true", "yes"),
+        "use_apoc_export": os.getenv("NEO4J_APOC_EXPORT", str(USE_APOC_EXPORT)).lower() in ("1", "true", "yes"),
+        "use_http_bulk": os.getenv("NEO4J_HTTP_BULK", str(USE_HTTP_BULK)).lower() in ("1", "true", "yes"),
+        "columnar_payload": os.getenv("NEO4J_COLUMNAR_PAYLOAD", str(COLUMNAR_PAYLOAD)).lower() in ("1", "true", "yes"),
+        "use_apoc_iterate": os.getenv("NEO4J_APOC_ITERATE", str(USE_APOC_ITERATE)).lower() in ("1", "true", "yes"),
+        "fuse_claim_relationships": os.getenv("NEO4J_FUSE_CLAIM_RELATIONSHIPS",
+                                              str(FUSE_CLAIM_RELATIONSHIPS)).lower() in ("1", "true", "yes"),
         "connection_timeout": CONNECTION_TIMEOUT,
-        "query_timeout": QUERY_TIMEOUT
+        "query_timeout": QUERY_TIMEOUT,
+        "max_connection_pool_size": int(os.getenv("NEO4J_MAX_POOL_SIZE", MAX_CONNECTION_POOL_SIZE)),
+        "connection_acquisition_timeout": CONNECTION_ACQUISITION_TIMEOUT,
+        "fetch_size": int(os.getenv("NEO4J_FETCH_SIZE", FETCH_SIZE))
     }
 
+def get_neo4j_config():
+    """Return Neo4j configuration dictionary
+
+    The resolved settings are cached; a copy is returned so callers that
+    adjust a value (e.g. the database fallback in setup) don't change it
+    for every later stage running in the same process.
+    """
+    return dict(resolve_neo4j_config())
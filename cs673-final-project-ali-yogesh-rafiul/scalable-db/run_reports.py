@@ -3,39 +3,25 @@ Reports Generation Script
 Runs only the reporting scripts (statistics and aggregations)
 Use this if you've already run the main pipeline
 """
-import os
 import sys
-import subprocess
+import argparse
 
-def run_script(script_name, description):
-    """Run a Python script and handle errors"""
-    print("\n" + "=" * 80)
-    print(f"Running: {description}")
-    print("=" * 80)
-    
-    script_path = os.path.join("scripts", script_name)
-    
-    if not os.path.exists(script_path):
-        print(f"✗ Script not found: {script_path}")
-        return False
-    
-    try:
-        result = subprocess.run(
-            [sys.executable, script_path],
-            check=True,
-            capture_output=False
-        )
-        print(f"✓ {description} completed successfully")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"✗ {description} failed with exit code {e.returncode}")
-        return False
-    except Exception as e:
-        print(f"✗ {description} failed: {e}")
-        return False
+from scripts._runner import run_script
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--isolate",
+        action="store_true",
+        help="run each script in its own Python process"
+    )
+    return parser.parse_args()
 
 def main():
     """Main execution function"""
+    args = parse_args()
+    
     print("=" * 80)
     print("HEALTHCARE FRAUD DETECTION - REPORTS GENERATION")
     print("=" * 80)
@@ -48,9 +34,10 @@ def main():
     ]
     
     failed_scripts = []
+    context = {}
     
     for script_name, description in scripts:
-        success = run_script(script_name, description)
+        success = run_script(script_name, description, context, inprocess=not args.isolate)
         if not success:
             failed_scripts.append((script_name, description))
             response = input(f"\n{description} failed. Continue anyway? (y/N): ")
@@ -2,26 +2,109 @@
 Data Cleansing Script
 Handles null values, drops invalid records, and generates data quality reports
 """
+import argparse
+import csv
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import os
 import sys
 
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+except ImportError:
+    # Fall back to pandas' reader if pyarrow is not installed
+    pa = None
+    pacsv = None
+
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Define paths
-RAW_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "raw")
-PROCESSED_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "processed")
-STATS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "stats")
+from scripts._paths import RAW_DATA_DIR, PROCESSED_DATA_DIR, STATS_DIR
 
 # Create output directories if they don't exist
 os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
 os.makedirs(STATS_DIR, exist_ok=True)
 
+# Column groups typed explicitly by the Arrow CSV reader
+ID_COLUMNS = ['BeneID', 'ClaimID', 'Provider', 'AttendingPhysician', 'OperatingPhysician',
+              'OtherPhysician', 'RenalDiseaseIndicator', 'ClmAdmitDiagnosisCode', 'DiagnosisGroupCode']
+CODE_COLUMNS = ([f'ClmDiagnosisCode_{i}' for i in range(1, 11)] +
+                [f'ClmProcedureCode_{i}' for i in range(1, 7)])
+DATE_COLUMNS = ['DOB', 'DOD', 'ClaimStartDt', 'ClaimEndDt', 'AdmissionDt', 'DischargeDt']
+AMOUNT_COLUMNS = ['InscClaimAmtReimbursed', 'DeductibleAmtPaid']
+
+# Low-cardinality string columns stored as pandas categories after cleaning
+BENEFICIARY_CATEGORY_COLUMNS = ['State', 'County', 'Race', 'Gender']
+PROVIDER_CATEGORY_COLUMNS = ['Provider', 'PotentialFraud']
+CLAIMS_CATEGORY_COLUMNS = (['Provider', 'AttendingPhysician', 'OperatingPhysician', 'OtherPhysician'] +
+                           CODE_COLUMNS)
+
+# Columns read from each raw file - only those used by the later pipeline stages
+CHRONIC_COLUMNS = ['ChronicCond_Alzheimer', 'ChronicCond_Heartfailure', 'ChronicCond_KidneyDisease',
+                   'ChronicCond_Cancer', 'ChronicCond_ObstrPulmonary', 'ChronicCond_Depression',
+                   'ChronicCond_Diabetes', 'ChronicCond_IschemicHeart', 'ChronicCond_Osteoporasis',
+                   'ChronicCond_rheumatoidarthritis', 'ChronicCond_stroke']
+CLAIMS_COLUMNS = (['BeneID', 'ClaimID', 'Provider', 'AttendingPhysician', 'OperatingPhysician',
+                   'OtherPhysician'] + DATE_COLUMNS[2:] + AMOUNT_COLUMNS + CODE_COLUMNS)
+USECOLS = {
+    'beneficiary': ['BeneID', 'DOB', 'DOD', 'Gender', 'Race', 'RenalDiseaseIndicator',
+                    'State', 'County'] + CHRONIC_COLUMNS,
+    'inpatient': CLAIMS_COLUMNS,
+    'outpatient': CLAIMS_COLUMNS,
+    'provider': ['Provider', 'PotentialFraud']
+}
+
+def arrow_column_types():
+    """Return the Arrow column types for the raw CSVs (missing columns are ignored)"""
+    column_types = {col: pa.string() for col in ID_COLUMNS + CODE_COLUMNS}
+    column_types.update({col: pa.date32() for col in DATE_COLUMNS})
+    # Amounts are whole dollars in the Kaggle files, but a decimal value ("1068.0") must not abort the read
+    column_types.update({col: pa.float64() for col in AMOUNT_COLUMNS})
+    return column_types
+
+def select_columns(filepath, usecols):
+    """Return the columns from usecols present in the file header (in file order)"""
+    with open(filepath, newline='') as f:
+        header = next(csv.reader(f), [])
+    wanted = set(usecols)
+    return [col for col in header if col in wanted]
+
+def read_csv(filepath, usecols=None):
+    """
+    Read a raw CSV file with the fastest available reader:
+      1. pyarrow.csv - multithreaded and typed via arrow_column_types()
+      2. pandas C parser over a memory-mapped file (when pyarrow is missing)
+    Only the columns in usecols are parsed when it is given.
+    Returns the DataFrame and its null counts per column.
+    """
+    columns = select_columns(filepath, usecols) if usecols is not None else None
+    
+    if pacsv is None:
+        df = pd.read_csv(filepath, usecols=columns, memory_map=True, low_memory=False)
+        return df, df.isna().sum()
+    
+    table = pacsv.read_csv(
+        filepath,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=64 << 20),
+        convert_options=pacsv.ConvertOptions(
+            column_types=arrow_column_types(),
+            include_columns=columns,
+            null_values=['', 'NA'],
+            strings_can_be_null=True
+        )
+    )
+    # Arrow tracks null counts per column at parse time, so no full scan is needed
+    null_counts = pd.Series({name: table.column(name).null_count for name in table.column_names},
+                            dtype='int64')
+    # Dates arrive as datetime64 columns, so convert_dates() skips them
+    df = table.to_pandas(split_blocks=True, self_destruct=True, date_as_object=False)
+    return df, null_counts
+
 def load_csv_files():
-    """Load all 4 CSV files into pandas DataFrames"""
+    """Load all 4 CSV files into pandas DataFrames, along with their null counts"""
     print("Loading CSV files...")
     
     files = {
@@ -31,47 +114,75 @@ def load_csv_files():
         'provider': 'Train-1542865627584.csv'
     }
     
+    # The files are independent and the readers release the GIL, so load them concurrently
     dataframes = {}
-    for key, filename in files.items():
-        filepath = os.path.join(RAW_DATA_DIR, filename)
-        if os.path.exists(filepath):
-            print(f"  Loading {filename}...")
-            dataframes[key] = pd.read_csv(filepath)
-            print(f"    Loaded {len(dataframes[key])} records")
-        else:
-            print(f"  WARNING: {filename} not found at {filepath}")
-            dataframes[key] = None
+    null_counts = {}
+    with ThreadPoolExecutor(max_workers=len(files)) as executor:
+        futures = {}
+        for key, filename in files.items():
+            filepath = RAW_DATA_DIR / filename
+            if os.path.exists(filepath):
+                print(f"  Loading {filename}...")
+                futures[key] = executor.submit(read_csv, filepath, USECOLS.get(key))
+            else:
+                print(f"  WARNING: {filename} not found at {filepath}")
+                dataframes[key] = None
+        
+        for key, future in futures.items():
+            dataframes[key], null_counts[key] = future.result()
+            print(f"    Loaded {len(dataframes[key])} {key} records")
     
-    return dataframes
+    return dataframes, null_counts
 
 def convert_dates(df, date_columns):
-    """Convert date columns to datetime"""
-    for col in date_columns:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors='coerce', format='%Y-%m-%d')
+    """Convert date columns to datetime (columns already typed by the Arrow reader are skipped)"""
+    pending = [col for col in date_columns
+               if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col])]
+    if pending:
+        # cache=True parses each distinct date string only once
+        df[pending] = df[pending].apply(pd.to_datetime, errors='coerce', format='%Y-%m-%d', cache=True)
     return df
 
-def generate_initial_report(dfs):
-    """Generate initial data quality report"""
-    report = []
-    report.append("=" * 80)
-    report.append("INITIAL DATA QUALITY REPORT")
-    report.append("=" * 80)
-    report.append(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+def write_line(out_file, line=""):
+    """Write one report line to the report file and echo it to the console"""
+    print(line)
+    print(line, file=out_file)
+
+def generate_initial_report(dfs, null_counts, out_file):
+    """Write the initial data quality report from the null counts computed at load time"""
+    write_line(out_file, "=" * 80)
+    write_line(out_file, "INITIAL DATA QUALITY REPORT")
+    write_line(out_file, "=" * 80)
+    write_line(out_file, f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
     
     for name, df in dfs.items():
         if df is not None:
-            report.append(f"\n{name.upper()} Dataset")
-            report.append("-" * 80)
-            report.append(f"Total Records: {len(df)}")
-            report.append(f"Total Columns: {len(df.columns)}")
-            report.append("\nNull Counts:")
-            null_counts = df.isnull().sum()
-            for col, count in null_counts[null_counts > 0].items():
+            write_line(out_file, f"\n{name.upper()} Dataset")
+            write_line(out_file, "-" * 80)
+            write_line(out_file, f"Total Records: {len(df)}")
+            write_line(out_file, f"Total Columns: {len(df.columns)}")
+            write_line(out_file, "\nNull Counts:")
+            counts = null_counts[name]
+            for col, count in counts[counts > 0].items():
                 pct = (count / len(df)) * 100
-                report.append(f"  {col}: {count} ({pct:.2f}%)")
-    
-    return "\n".join(report)
+                write_line(out_file, f"  {col}: {count} ({pct:.2f}%)")
+
+def downcast_dtypes(df, category_cols=()):
+    """Shrink numeric columns to the narrowest dtype and categorize repeated strings"""
+    for col in df.select_dtypes('int64').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    for col in df.select_dtypes('float64').columns:
+        df[col] = pd.to_numeric(df[col], downcast='float')
+    for col in category_cols:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+def as_text(values):
+    """Codes as text ('5', not 5 or '5.0'), with missing values left missing"""
+    if pd.api.types.is_numeric_dtype(values):
+        values = values.astype('Int64')
+    return values.astype('string')
 
 def clean_beneficiary_data(df):
     """Clean beneficiary data"""
@@ -87,23 +198,30 @@ def clean_beneficiary_data(df):
     
     # Transform nulls
     # DOD: null means alive, set isDeceased = 0
-    df['isDeceased'] = df['DOD'].notna().astype(int)
-    
-    # County and State: Replace null with "UNKNOWN"
-    df['County'] = df['County'].fillna('UNKNOWN')
-    df['State'] = df['State'].fillna('UNKNOWN')
-    
-    # Calculate age from DOB
-    current_date = pd.Timestamp.now()
-    df['age'] = ((current_date - df['DOB']) / pd.Timedelta(days=365.25)).round().astype('Int64')
-    
-    # Keep chronic condition columns as boolean (convert Y/N to 1/0)
+    df['isDeceased'] = df['DOD'].notna().to_numpy().view(np.int8)
+    
+    # County and State: Replace null with "UNKNOWN" (the codes are stored as text,
+    # so the column keeps a single type for Parquet)
+    df['County'] = as_text(df['County']).fillna('UNKNOWN')
+    df['State'] = as_text(df['State']).fillna('UNKNOWN')
+    
+    # Calculate age from DOB using integer day arithmetic:
+    # round(days / 365.25) == (4 * days + 730) // 1461
+    missing_dob = df['DOB'].isna().to_numpy()
+    today = np.datetime64(pd.Timestamp.now().date(), 'D')
+    days = (today - df['DOB'].to_numpy(dtype='datetime64[D]')).astype('int64')
+    days[missing_dob] = 0
+    age = ((4 * days + 730) // 1461).astype('int16')
+    df['age'] = pd.arrays.IntegerArray(age, missing_dob)
+    
+    # Keep chronic condition columns as boolean flags in one vectorized pass
+    # Y/y/1 -> 1, anything else (N, 2 = "No" in the CMS coding, null) -> 0
     chronic_cols = [col for col in df.columns if 'ChronicCond' in col or 'RenalDiseaseIndicator' in col]
-    for col in chronic_cols:
-        if col in df.columns:
-            # Handle Y/N values: Y -> 1, N -> 0, null -> 0
-            df[col] = df[col].replace({'Y': 1, 'N': 0, 'y': 1, 'n': 0})
-            df[col] = df[col].fillna(0).astype(int)
+    if chronic_cols:
+        sub = df[chronic_cols]
+        df[chronic_cols] = ((sub == 'Y') | (sub == 'y') | (sub == 1)).to_numpy().view(np.int8)
+    
+    df = downcast_dtypes(df, category_cols=BENEFICIARY_CATEGORY_COLUMNS)
     
     print(f"  Processed {len(df)} records (dropped {initial_count - len(df)})")
     return df
@@ -120,7 +238,9 @@ def clean_provider_data(df):
     df = df.dropna(subset=['Provider'])
     
     # Set isFraud flag
-    df['isFraud'] = (df['PotentialFraud'] == 'Yes').astype(int)
+    df['isFraud'] = (df['PotentialFraud'].to_numpy() == 'Yes').view(np.int8)
+    
+    df = downcast_dtypes(df, category_cols=PROVIDER_CATEGORY_COLUMNS)
     
     print(f"  Processed {len(df)} records (dropped {initial_count - len(df)})")
     return df
@@ -141,37 +261,45 @@ def clean_claims_data(inpatient_df, outpatient_df):
         # Drop records with null Provider, BeneID, or ClaimID
         critical_cols = ['Provider', 'BeneID', 'ClaimID']
         existing_critical = [col for col in critical_cols if col in df.columns]
-        df = df.dropna(subset=existing_critical)
+        df = df.dropna(subset=existing_critical, ignore_index=True)
         
         # Convert dates
         date_cols = ['ClaimStartDt', 'ClaimEndDt', 'AdmissionDt', 'DischargeDt']
         existing_dates = [col for col in date_cols if col in df.columns]
         df = convert_dates(df, existing_dates)
         
-        # Calculate totalCost
+        # Calculate totalCost in a single numpy pass (missing amounts count as 0)
         if 'InscClaimAmtReimbursed' in df.columns and 'DeductibleAmtPaid' in df.columns:
-            df['totalCost'] = df['InscClaimAmtReimbursed'].fillna(0) + df['DeductibleAmtPaid'].fillna(0)
+            reimbursed = df['InscClaimAmtReimbursed'].to_numpy()
+            deductible = df['DeductibleAmtPaid'].to_numpy()
+            df['totalCost'] = np.add(np.nan_to_num(reimbursed), np.nan_to_num(deductible))
         else:
             df['totalCost'] = 0
         
-        # Calculate claimDuration
+        # Calculate claimDuration as whole days using integer day arithmetic
         if 'ClaimStartDt' in df.columns and 'ClaimEndDt' in df.columns:
-            df['claimDuration'] = (df['ClaimEndDt'] - df['ClaimStartDt']).dt.days
+            missing = (df['ClaimStartDt'].isna() | df['ClaimEndDt'].isna()).to_numpy()
+            start = df['ClaimStartDt'].to_numpy(dtype='datetime64[D]').view('i8')
+            end = df['ClaimEndDt'].to_numpy(dtype='datetime64[D]').view('i8')
+            duration = end - start
+            duration[missing] = 0
+            df['claimDuration'] = pd.arrays.IntegerArray(duration.astype('int16'), missing)
         else:
-            df['claimDuration'] = None
+            df['claimDuration'] = pd.array([pd.NA] * len(df), dtype='Int16')
+        
+        df = downcast_dtypes(df, category_cols=CLAIMS_CATEGORY_COLUMNS)
         
         print(f"    Processed {len(df)} records (dropped {initial_count - len(df)})")
         cleaned_dfs[name] = df
     
     return cleaned_dfs
 
-def generate_final_report(dfs_initial, dfs_cleaned):
-    """Generate final data quality report"""
-    report = []
-    report.append("=" * 80)
-    report.append("FINAL DATA QUALITY REPORT")
-    report.append("=" * 80)
-    report.append(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+def generate_final_report(dfs_initial, dfs_cleaned, out_file):
+    """Write the final data quality report"""
+    write_line(out_file, "=" * 80)
+    write_line(out_file, "FINAL DATA QUALITY REPORT")
+    write_line(out_file, "=" * 80)
+    write_line(out_file, f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
     
     for name in dfs_initial.keys():
         if name in dfs_cleaned and dfs_cleaned[name] is not None:
@@ -179,70 +307,101 @@ def generate_final_report(dfs_initial, dfs_cleaned):
             cleaned = dfs_cleaned[name]
             
             if initial is not None:
-                report.append(f"\n{name.upper()} Dataset")
-                report.append("-" * 80)
-                report.append(f"Initial Records: {len(initial)}")
-                report.append(f"Final Records: {len(cleaned)}")
-                report.append(f"Records Dropped: {len(initial) - len(cleaned)}")
-                report.append(f"Drop Rate: {((len(initial) - len(cleaned)) / len(initial) * 100):.2f}%")
-    
-    return "\n".join(report)
+                write_line(out_file, f"\n{name.upper()} Dataset")
+                write_line(out_file, "-" * 80)
+                write_line(out_file, f"Initial Records: {len(initial)}")
+                write_line(out_file, f"Final Records: {len(cleaned)}")
+                write_line(out_file, f"Records Dropped: {len(initial) - len(cleaned)}")
+                write_line(out_file, f"Drop Rate: {((len(initial) - len(cleaned)) / len(initial) * 100):.2f}%")
 
-def main():
-    """Main execution function"""
+def save_cleaned_data(dfs_cleaned, legacy_csv=False):
+    """Save cleaned DataFrames as Parquet (and optionally CSV)"""
+    print("\nSaving cleaned data files...")
+    for name, df in dfs_cleaned.items():
+        if df is None:
+            continue
+        
+        if pa is not None:
+            output_path = PROCESSED_DATA_DIR / f"{name}_cleaned.parquet"
+            df.to_parquet(output_path, engine='pyarrow', compression='zstd', index=False)
+            print(f"  Saved {name} to {output_path}")
+        
+        if legacy_csv or pa is None:
+            output_path = PROCESSED_DATA_DIR / f"{name}_cleaned.csv"
+            if pa is not None:
+                pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), output_path)
+            else:
+                df.to_csv(output_path, index=False)
+            print(f"  Saved {name} to {output_path}")
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Clean the raw CMS data files")
+    parser.add_argument(
+        "--legacy-csv",
+        action="store_true",
+        help="also write the cleaned data as CSV files"
+    )
+    return parser.parse_args()
+
+def main(context=None, legacy_csv=False):
+    """Main execution function (context is passed through by the in-process pipeline runner)"""
     print("=" * 80)
     print("DATA CLEANSING PIPELINE")
     print("=" * 80)
     
     # Load CSV files
-    dfs_initial = load_csv_files()
-    
-    # Generate initial report
-    initial_report = generate_initial_report(dfs_initial)
-    print("\n" + initial_report)
-    
-    # Save initial report
-    report_path = os.path.join(STATS_DIR, "data_quality_report.txt")
-    with open(report_path, 'w') as f:
-        f.write(initial_report)
-    print(f"\nInitial report saved to {report_path}")
-    
-    # Clean data
-    dfs_cleaned = {}
-    
-    if 'beneficiary' in dfs_initial:
-        dfs_cleaned['beneficiary'] = clean_beneficiary_data(dfs_initial['beneficiary'])
-    
-    if 'provider' in dfs_initial:
-        dfs_cleaned['provider'] = clean_provider_data(dfs_initial['provider'])
-    
-    if 'inpatient' in dfs_initial or 'outpatient' in dfs_initial:
-        cleaned_claims = clean_claims_data(
-            dfs_initial.get('inpatient'),
-            dfs_initial.get('outpatient')
-        )
-        dfs_cleaned.update(cleaned_claims)
-    
-    # Generate final report
-    final_report = generate_final_report(dfs_initial, dfs_cleaned)
-    print("\n" + final_report)
-    
-    # Append final report to file
-    with open(report_path, 'a') as f:
-        f.write("\n\n" + final_report)
-    
-    # Save cleaned CSVs
-    print("\nSaving cleaned CSV files...")
-    for name, df in dfs_cleaned.items():
-        if df is not None:
-            output_path = os.path.join(PROCESSED_DATA_DIR, f"{name}_cleaned.csv")
-            df.to_csv(output_path, index=False)
-            print(f"  Saved {name} to {output_path}")
+    dfs_initial, null_counts = load_csv_files()
+    
+    # Write both reports straight to a temporary file (and the console), then
+    # move it into place so a failed run never leaves a half-written report
+    report_path = STATS_DIR / "data_quality_report.txt"
+    tmp_path = report_path.with_name(report_path.name + ".tmp")
+    try:
+        with open(tmp_path, 'w') as f:
+            print()
+            generate_initial_report(dfs_initial, null_counts, f)
+            print("\nInitial report generated")
+            
+            # Clean data
+            dfs_cleaned = {}
+            
+            if 'beneficiary' in dfs_initial:
+                dfs_cleaned['beneficiary'] = clean_beneficiary_data(dfs_initial['beneficiary'])
+            
+            if 'provider' in dfs_initial:
+                dfs_cleaned['provider'] = clean_provider_data(dfs_initial['provider'])
+            
+            if 'inpatient' in dfs_initial or 'outpatient' in dfs_initial:
+                cleaned_claims = clean_claims_data(
+                    dfs_initial.get('inpatient'),
+                    dfs_initial.get('outpatient')
+                )
+                dfs_cleaned.update(cleaned_claims)
+            
+            # Append the final report
+            print()
+            f.write("\n")
+            generate_final_report(dfs_initial, dfs_cleaned, f)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, report_path)
+    print(f"\nData quality report saved to {report_path}")
+    
+    # Save cleaned data
+    save_cleaned_data(dfs_cleaned, legacy_csv=legacy_csv)
     
     print("\n" + "=" * 80)
     print("DATA CLEANSING COMPLETE")
     print("=" * 80)
+    
+    # Hand the cleaned frames to the next step when run in-process
+    if context is not None:
+        context['cleaned'] = dfs_cleaned
+    return context
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(legacy_csv=args.legacy_csv)
 
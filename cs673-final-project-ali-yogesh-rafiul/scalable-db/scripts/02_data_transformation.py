@@ -2,43 +2,155 @@
 Data Transformation Script
 Transforms cleaned data into graph model format ready for Neo4j loading
 """
+import argparse
+import csv
 import pandas as pd
 import numpy as np
-import os
 import sys
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    from pyarrow import csv as pacsv
+except ImportError:
+    # Fall back to pandas' CSV reader/writer if pyarrow is not installed
+    pa = None
+    pc = None
+    pq = None
+    pacsv = None
 
 # Add parent directory to path for imports
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from scripts._paths import PROCESSED_DATA_DIR
+
+# Transformed files are written next to the cleaned data
+OUTPUT_DIR = PROCESSED_DATA_DIR
+
+# Columns read from each cleaned file - only those used by this step
+# (beneficiary chronic condition flags are matched by name, see cleaned_columns())
+CLAIM_ID_COLUMNS = (['ClaimID', 'BeneID', 'Provider', 'AttendingPhysician', 'OperatingPhysician', 'OtherPhysician'] +
+                    [f'ClmDiagnosisCode_{i}' for i in range(1, 11)] +
+                    [f'ClmProcedureCode_{i}' for i in range(1, 7)])
+CLAIM_DATE_COLUMNS = ['ClaimStartDt', 'ClaimEndDt', 'AdmissionDt', 'DischargeDt']
+CLEANED_COLUMNS = {
+    'beneficiary': ['BeneID', 'age', 'State', 'County', 'Gender', 'Race', 'isDeceased'],
+    'inpatient': CLAIM_ID_COLUMNS + CLAIM_DATE_COLUMNS + ['totalCost', 'InscClaimAmtReimbursed', 'DeductibleAmtPaid'],
+    'outpatient': CLAIM_ID_COLUMNS + CLAIM_DATE_COLUMNS + ['totalCost', 'InscClaimAmtReimbursed', 'DeductibleAmtPaid'],
+    'provider': ['Provider', 'isFraud']
+}
+
+CLAIM_TYPES = ['Inpatient', 'Outpatient']
+CLAIM_FILES = ['inpatient_cleaned', 'outpatient_cleaned']
+
+# Rows per record batch when streaming the claim files (--streaming)
+STREAM_BATCH_ROWS = 250_000
+
+# Explicit dtypes for the CSV fallback, so no column needs type inference
+FLAG_COLUMNS = ['Gender', 'Race', 'isDeceased', 'isFraud']
+LOCATION_COLUMNS = ['State', 'County']
+
+def is_condition_column(col):
+    """Return True for the beneficiary chronic condition / renal disease flag columns"""
+    return 'ChronicCond' in col or 'RenalDiseaseIndicator' in col
+
+def cleaned_columns(key, available):
+    """Pick the columns this step uses from a cleaned file (in file order)"""
+    wanted = set(CLEANED_COLUMNS[key])
+    return [col for col in available
+            if col in wanted or (key == 'beneficiary' and is_condition_column(col))]
+
+def csv_dtypes(columns):
+    """Return the read dtypes for the given cleaned CSV columns ('str' for IDs, codes and locations)"""
+    dtypes = {}
+    for col in columns:
+        if col in FLAG_COLUMNS or is_condition_column(col):
+            dtypes[col] = 'int8'
+        elif col in CLAIM_ID_COLUMNS or col in LOCATION_COLUMNS:
+            dtypes[col] = 'str'
+    return dtypes
 
-# Define paths
-PROCESSED_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "processed")
-OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "processed")
+def read_csv(path, columns=None, dtypes=None, date_columns=()):
+    """Read a CSV file with the multithreaded Arrow reader (pandas when pyarrow is missing)"""
+    dtypes = dtypes or {}
+    if pacsv is None:
+        return pd.read_csv(path, usecols=columns, dtype=dtypes, parse_dates=list(date_columns))
+    
+    column_types = {col: pa.string() if dtype == 'str' else pa.from_numpy_dtype(np.dtype(dtype))
+                    for col, dtype in dtypes.items()}
+    column_types.update({col: pa.timestamp('ms') for col in date_columns})
+    table = pacsv.read_csv(
+        path,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=64 << 20),
+        convert_options=pacsv.ConvertOptions(column_types=column_types, include_columns=columns,
+                                                strings_can_be_null=True)
+    )
+    return table.to_pandas(split_blocks=True, self_destruct=True, date_as_object=False)
 
-def load_cleaned_data():
-    """Load cleaned CSV files"""
+def read_cleaned_file(key, path):
+    """Read one cleaned Parquet or CSV file, parsing only the columns this step uses"""
+    if path.suffix == '.parquet':
+        columns = cleaned_columns(key, pq.read_schema(path).names) if pq is not None else None
+        return pd.read_parquet(path, columns=columns)
+    
+    with open(path, newline='') as f:
+        header = next(csv.reader(f), [])
+    columns = cleaned_columns(key, header)
+    date_columns = [col for col in columns if col in CLAIM_DATE_COLUMNS]
+    return read_csv(path, columns, csv_dtypes(columns), date_columns)
+
+def write_csv(df, path):
+    """Write a DataFrame as CSV with the Arrow writer (pandas when pyarrow is missing)"""
+    if pacsv is None:
+        df.to_csv(path, index=False)
+        return
+    pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), path)
+
+def load_cleaned_data(keys=None):
+    """Load cleaned data files (all of them, or only the given keys)"""
     print("Loading cleaned data files...")
     
     files = {
-        'beneficiary': 'beneficiary_cleaned.csv',
-        'inpatient': 'inpatient_cleaned.csv',
-        'outpatient': 'outpatient_cleaned.csv',
-        'provider': 'provider_cleaned.csv'
+        'beneficiary': 'beneficiary_cleaned',
+        'inpatient': 'inpatient_cleaned',
+        'outpatient': 'outpatient_cleaned',
+        'provider': 'provider_cleaned'
     }
+    if keys is not None:
+        files = {key: basename for key, basename in files.items() if key in keys}
     
+    # The files are independent and both readers release the GIL, so load them concurrently
     dataframes = {}
-    for key, filename in files.items():
-        filepath = os.path.join(PROCESSED_DATA_DIR, filename)
-        if os.path.exists(filepath):
-            print(f"  Loading {filename}...")
-            dataframes[key] = pd.read_csv(filepath, parse_dates=True, low_memory=False)
-            print(f"    Loaded {len(dataframes[key])} records")
-        else:
-            print(f"  WARNING: {filename} not found at {filepath}")
-            dataframes[key] = None
+    with ThreadPoolExecutor(max_workers=len(files)) as executor:
+        futures = {}
+        for key, basename in files.items():
+            # Prefer the Parquet output of the cleansing step, fall back to CSV
+            parquet_path = PROCESSED_DATA_DIR / f"{basename}.parquet"
+            csv_path = PROCESSED_DATA_DIR / f"{basename}.csv"
+            if parquet_path.exists():
+                print(f"  Loading {basename}.parquet...")
+                futures[key] = executor.submit(read_cleaned_file, key, parquet_path)
+            elif csv_path.exists():
+                print(f"  Loading {basename}.csv...")
+                futures[key] = executor.submit(read_cleaned_file, key, csv_path)
+            else:
+                print(f"  WARNING: {basename} not found in {PROCESSED_DATA_DIR}")
+                dataframes[key] = None
+        
+        for key, future in futures.items():
+            dataframes[key] = future.result()
+            print(f"    Loaded {len(dataframes[key])} {key} records")
     
     return dataframes
 
+def claim_type_column(n, type_code):
+    """Return an int8-coded categorical claim type column of length n"""
+    return pd.Categorical.from_codes(np.full(n, type_code, dtype=np.int8), categories=CLAIM_TYPES)
+
 def merge_claims_data(inpatient_df, outpatient_df):
     """Merge inpatient and outpatient claims"""
     print("\nMerging claims data...")
@@ -46,20 +158,21 @@ def merge_claims_data(inpatient_df, outpatient_df):
     if inpatient_df is None and outpatient_df is None:
         return None
     
+    # Tag each claim type with an int8-coded categorical instead of a broadcast string column
     claims_list = []
     
     if inpatient_df is not None:
         print(f"  Processing {len(inpatient_df)} inpatient claims...")
-        inpatient_df['type'] = 'Inpatient'
+        inpatient_df['type'] = claim_type_column(len(inpatient_df), 0)
         claims_list.append(inpatient_df)
     
     if outpatient_df is not None:
         print(f"  Processing {len(outpatient_df)} outpatient claims...")
-        outpatient_df['type'] = 'Outpatient'
+        outpatient_df['type'] = claim_type_column(len(outpatient_df), 1)
         claims_list.append(outpatient_df)
     
     if claims_list:
-        merged_claims = pd.concat(claims_list, ignore_index=True, sort=False)
+        merged_claims = pd.concat(claims_list, ignore_index=True, copy=False, sort=False)
         print(f"  Total merged claims: {len(merged_claims)}")
         return merged_claims
     
@@ -75,11 +188,12 @@ def prepare_provider_nodes(provider_df):
     # Select relevant columns
     provider_nodes = provider_df[['Provider', 'isFraud']].copy()
     provider_nodes = provider_nodes.rename(columns={'Provider': 'id'})
-    provider_nodes = provider_nodes.drop_duplicates(subset=['id'])
+    provider_nodes = provider_nodes.drop_duplicates(subset=['id'], keep='first', ignore_index=True)
     
     print(f"  Total unique providers: {len(provider_nodes)}")
-    print(f"  Fraud providers: {provider_nodes['isFraud'].sum()}")
-    print(f"  Legitimate providers: {(provider_nodes['isFraud'] == 0).sum()}")
+    fraud_counts = provider_nodes['isFraud'].value_counts()
+    print(f"  Fraud providers: {fraud_counts.get(1, 0)}")
+    print(f"  Legitimate providers: {fraud_counts.get(0, 0)}")
     
     return provider_nodes
 
@@ -102,20 +216,15 @@ def prepare_beneficiary_nodes(beneficiary_df):
     existing_cols = [col for col in cols if col in beneficiary_df.columns]
     beneficiary_nodes = beneficiary_df[existing_cols].copy()
     beneficiary_nodes = beneficiary_nodes.rename(columns={'BeneID': 'id'})
-    beneficiary_nodes = beneficiary_nodes.drop_duplicates(subset=['id'])
+    beneficiary_nodes = beneficiary_nodes.drop_duplicates(subset=['id'], keep='first', ignore_index=True)
     
     print(f"  Total unique beneficiaries: {len(beneficiary_nodes)}")
     print(f"  Deceased beneficiaries: {beneficiary_nodes['isDeceased'].sum()}")
     
     return beneficiary_nodes
 
-def prepare_claim_nodes(claims_df):
-    """Prepare Claim nodes for Neo4j"""
-    if claims_df is None:
-        return None
-    
-    print("\nPreparing Claim nodes...")
-    
+def build_claim_nodes(claims_df):
+    """Build the Claim node rows for a claims DataFrame"""
     # Select relevant columns
     claim_cols = ['ClaimID', 'type', 'totalCost', 'ClaimStartDt', 'ClaimEndDt', 
                   'AdmissionDt', 'DischargeDt', 'InscClaimAmtReimbursed', 'DeductibleAmtPaid']
@@ -136,19 +245,52 @@ def prepare_claim_nodes(claims_df):
     }
     
     claim_nodes = claim_nodes.rename(columns=rename_map)
-    claim_nodes = claim_nodes.drop_duplicates(subset=['id'])
+    claim_nodes = claim_nodes.drop_duplicates(subset=['id'], keep='first', ignore_index=True)
+    
+    # Cast each amount to float32 and fill missing values with 0 in place on the cast copy
+    # (the amounts are whole dollars well below 2**24, so float32 holds them exactly)
+    for col in ['totalCost', 'reimbursedAmount', 'deductibleAmount']:
+        claim_nodes[col] = np.nan_to_num(claim_nodes[col].to_numpy(dtype=np.float32), copy=False)
+    
+    return claim_nodes
+
+def prepare_claim_nodes(claims_df):
+    """Prepare Claim nodes for Neo4j"""
+    if claims_df is None:
+        return None
+    
+    print("\nPreparing Claim nodes...")
     
-    # Fill NaN values appropriately
-    claim_nodes['totalCost'] = claim_nodes['totalCost'].fillna(0)
-    claim_nodes['reimbursedAmount'] = claim_nodes['reimbursedAmount'].fillna(0)
-    claim_nodes['deductibleAmount'] = claim_nodes['deductibleAmount'].fillna(0)
+    claim_nodes = build_claim_nodes(claims_df)
     
     print(f"  Total unique claims: {len(claim_nodes)}")
-    print(f"  Inpatient claims: {(claim_nodes['type'] == 'Inpatient').sum()}")
-    print(f"  Outpatient claims: {(claim_nodes['type'] == 'Outpatient').sum()}")
+    # One count per category of the categorical type column
+    type_counts = claim_nodes['type'].value_counts()
+    print(f"  Inpatient claims: {type_counts.get('Inpatient', 0)}")
+    print(f"  Outpatient claims: {type_counts.get('Outpatient', 0)}")
     
     return claim_nodes
 
+def unique_values(df, columns):
+    """Return the distinct non-null values across several columns (hashed in Arrow when available)"""
+    if pa is not None:
+        try:
+            chunks = pa.chunked_array([pa.array(df[col].to_numpy(dtype=object), from_pandas=True)
+                                       for col in columns])
+            return pc.unique(pc.drop_null(chunks)).to_numpy(zero_copy_only=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed value types across columns (e.g. numeric and text codes) - use pandas
+            pass
+    
+    values = pd.unique(np.concatenate([df[col].to_numpy(dtype=object) for col in columns]))
+    return values[~pd.isna(values)]
+
+def string_column(values):
+    """Wrap distinct ID values in an Arrow-backed string array (kept as given without pyarrow)"""
+    if pa is None:
+        return values
+    return pd.array(values, dtype='string[pyarrow]')
+
 def extract_physician_nodes(claims_df):
     """Extract unique Physician nodes from claims data"""
     if claims_df is None:
@@ -163,20 +305,53 @@ def extract_physician_nodes(claims_df):
         print("  No physician columns found")
         return None
     
-    # Collect all unique physician IDs
-    physicians = set()
-    for col in existing_physician_cols:
-        unique_physicians = claims_df[col].dropna().unique()
-        physicians.update(unique_physicians)
+    # Collect all unique physician IDs in one hash pass over the stacked columns
+    physicians = unique_values(claims_df, existing_physician_cols)
     
-    # Create DataFrame
-    physician_nodes = pd.DataFrame({'id': list(physicians)})
-    physician_nodes = physician_nodes.sort_values('id').reset_index(drop=True)
+    # Create DataFrame (first-seen order is deterministic and the loader does not need sorted IDs)
+    physician_nodes = pd.DataFrame({'id': string_column(physicians)})
     
     print(f"  Total unique physicians: {len(physician_nodes)}")
     
     return physician_nodes
 
+def code_columns(columns):
+    """Return the [diagnosis, procedure] code columns present in columns"""
+    diagnosis_cols = [f'ClmDiagnosisCode_{i}' for i in range(1, 11)]
+    procedure_cols = [f'ClmProcedureCode_{i}' for i in range(1, 7)]
+    return [[col for col in diagnosis_cols if col in columns],
+            [col for col in procedure_cols if col in columns]]
+
+def unique_codes(claims_df):
+    """Return the distinct [diagnosis, procedure] codes of a claims DataFrame as strings"""
+    # Convert to string to handle mixed types (numeric and alphanumeric codes)
+    return [unique_values(claims_df, columns).astype(str) if columns else np.array([], dtype=str)
+            for columns in code_columns(claims_df.columns)]
+
+def build_medical_code_nodes(codes_by_type):
+    """Build the MedicalCode node rows from the distinct [diagnosis, procedure] codes"""
+    # Build one frame per code type straight from the distinct values
+    code_types = ['Diagnosis', 'Procedure']
+    code_frames = []
+    
+    for type_code, codes in enumerate(codes_by_type):
+        if len(codes) == 0:
+            continue
+        code_frames.append(pd.DataFrame({
+            'code': codes,
+            'type': pd.Categorical.from_codes(
+                np.full(len(codes), type_code, dtype=np.int8), categories=code_types)
+        }))
+    
+    if not code_frames:
+        return None
+    
+    # Create DataFrame, sort, then remove duplicates - the stable sort keeps
+    # diagnosis rows ahead of procedure rows, so diagnosis wins on duplicate codes
+    code_nodes = pd.concat(code_frames, ignore_index=True)
+    code_nodes = code_nodes.sort_values('code', kind='stable')
+    return code_nodes.drop_duplicates(subset=['code'], keep='first', ignore_index=True)
+
 def extract_medical_code_nodes(claims_df):
     """Extract unique MedicalCode nodes from claims data"""
     if claims_df is None:
@@ -184,184 +359,273 @@ def extract_medical_code_nodes(claims_df):
     
     print("\nExtracting MedicalCode nodes...")
     
-    # Diagnosis codes
-    diagnosis_cols = [f'ClmDiagnosisCode_{i}' for i in range(1, 11)]
-    existing_diagnosis = [col for col in diagnosis_cols if col in claims_df.columns]
+    code_nodes = build_medical_code_nodes(unique_codes(claims_df))
     
-    # Procedure codes
-    procedure_cols = [f'ClmProcedureCode_{i}' for i in range(1, 7)]
-    existing_procedure = [col for col in procedure_cols if col in claims_df.columns]
-    
-    codes = []
-    
-    # Collect diagnosis codes
-    for col in existing_diagnosis:
-        unique_codes = claims_df[col].dropna().unique()
-        for code in unique_codes:
-            # Convert to string to handle mixed types (numeric and alphanumeric codes)
-            codes.append({'code': str(code), 'type': 'Diagnosis'})
-    
-    # Collect procedure codes
-    for col in existing_procedure:
-        unique_codes = claims_df[col].dropna().unique()
-        for code in unique_codes:
-            # Convert to string to handle mixed types (numeric and alphanumeric codes)
-            codes.append({'code': str(code), 'type': 'Procedure'})
-    
-    # Create DataFrame and remove duplicates
-    if codes:
-        code_nodes = pd.DataFrame(codes)
-        code_nodes = code_nodes.drop_duplicates(subset=['code'])
-        # Ensure code column is string type before sorting
-        code_nodes['code'] = code_nodes['code'].astype(str)
-        code_nodes = code_nodes.sort_values('code').reset_index(drop=True)
-        
+    if code_nodes is not None:
         print(f"  Total unique medical codes: {len(code_nodes)}")
-        print(f"  Diagnosis codes: {(code_nodes['type'] == 'Diagnosis').sum()}")
-        print(f"  Procedure codes: {(code_nodes['type'] == 'Procedure').sum()}")
+        type_counts = code_nodes['type'].value_counts()
+        print(f"  Diagnosis codes: {type_counts.get('Diagnosis', 0)}")
+        print(f"  Procedure codes: {type_counts.get('Procedure', 0)}")
         
         return code_nodes
     
     return None
 
+def build_relationships(claims_df):
+    """Build the relationship rows for a claims DataFrame, keyed by relationship type"""
+    relationships = {}
+    
+    # FILED: Provider -> Claim
+    if 'Provider' in claims_df.columns and 'ClaimID' in claims_df.columns:
+        filed = claims_df[['Provider', 'ClaimID']].dropna()
+        relationships['FILED'] = filed.rename(columns={'Provider': 'provider_id', 'ClaimID': 'claim_id'})
+    
+    # HAS_CLAIM: Beneficiary -> Claim
+    if 'BeneID' in claims_df.columns and 'ClaimID' in claims_df.columns:
+        has_claim = claims_df[['BeneID', 'ClaimID']].dropna()
+        relationships['HAS_CLAIM'] = has_claim.rename(columns={'BeneID': 'beneficiary_id', 'ClaimID': 'claim_id'})
+    
+    # ATTENDED_BY: Claim -> Physician
+    physician_cols = ['AttendingPhysician', 'OperatingPhysician', 'OtherPhysician']
+    existing_physician_cols = [col for col in physician_cols if col in claims_df.columns]
+    
+    if existing_physician_cols and 'ClaimID' in claims_df.columns:
+        # One melt reshapes all physician columns into (claim, physician) rows
+        attended_by = claims_df.melt(id_vars='ClaimID', value_vars=existing_physician_cols,
+                                     var_name='physician_type', value_name='physician_id')
+        attended_by = attended_by.dropna(subset=['physician_id'])
+        attended_by = attended_by.rename(columns={'ClaimID': 'claim_id'})
+        attended_by['physician_type'] = attended_by['physician_type'].astype('category').cat.rename_categories(
+            lambda col: col.replace('Physician', '').strip())
+        relationships['ATTENDED_BY'] = attended_by[['claim_id', 'physician_id', 'physician_type']].reset_index(drop=True)
+    
+    # INCLUDES_CODE: Claim -> MedicalCode
+    code_relationships = []
+    
+    # One melt per code type instead of a slice/copy per code column
+    code_types = ['Diagnosis', 'Procedure']
+    for type_code, columns in enumerate(code_columns(claims_df.columns)):
+        if columns and 'ClaimID' in claims_df.columns:
+            code_rel = claims_df.melt(id_vars='ClaimID', value_vars=columns, value_name='code')
+            code_rel = code_rel.drop(columns='variable').dropna(subset=['code'])
+            code_rel = code_rel.rename(columns={'ClaimID': 'claim_id'})
+            code_rel['code_type'] = pd.Categorical.from_codes(
+                np.full(len(code_rel), type_code, dtype=np.int8), categories=code_types)
+            code_relationships.append(code_rel)
+    
+    if code_relationships:
+        relationships['INCLUDES_CODE'] = pd.concat(code_relationships, ignore_index=True, copy=False)
+    
+    return relationships
+
 def create_relationship_mappings(claims_df, provider_df, beneficiary_df):
     """Create relationship mapping DataFrames"""
     print("\nCreating relationship mappings...")
     
-    relationships = {}
+    if claims_df is None:
+        return {}
     
-    if claims_df is not None:
-        # FILED: Provider -> Claim
-        if 'Provider' in claims_df.columns and 'ClaimID' in claims_df.columns:
-            filed = claims_df[['Provider', 'ClaimID']].copy()
-            filed = filed.dropna()
-            filed = filed.rename(columns={'Provider': 'provider_id', 'ClaimID': 'claim_id'})
-            relationships['FILED'] = filed
-            print(f"  FILED relationships: {len(filed)}")
-        
-        # HAS_CLAIM: Beneficiary -> Claim
-        if 'BeneID' in claims_df.columns and 'ClaimID' in claims_df.columns:
-            has_claim = claims_df[['BeneID', 'ClaimID']].copy()
-            has_claim = has_claim.dropna()
-            has_claim = has_claim.rename(columns={'BeneID': 'beneficiary_id', 'ClaimID': 'claim_id'})
-            relationships['HAS_CLAIM'] = has_claim
-            print(f"  HAS_CLAIM relationships: {len(has_claim)}")
-        
-        # ATTENDED_BY: Claim -> Physician
-        physician_cols = ['AttendingPhysician', 'OperatingPhysician', 'OtherPhysician']
-        existing_physician_cols = [col for col in physician_cols if col in claims_df.columns]
-        
-        if existing_physician_cols and 'ClaimID' in claims_df.columns:
-            attended_by_list = []
-            for col in existing_physician_cols:
-                attended = claims_df[['ClaimID', col]].copy()
-                attended = attended.dropna(subset=[col])
-                attended = attended.rename(columns={'ClaimID': 'claim_id', col: 'physician_id'})
-                attended['physician_type'] = col.replace('Physician', '').strip()
-                attended_by_list.append(attended)
-            
-            if attended_by_list:
-                attended_by = pd.concat(attended_by_list, ignore_index=True)
-                relationships['ATTENDED_BY'] = attended_by
-                print(f"  ATTENDED_BY relationships: {len(attended_by)}")
-        
-        # INCLUDES_CODE: Claim -> MedicalCode
-        code_relationships = []
-        
-        # Diagnosis codes
-        diagnosis_cols = [f'ClmDiagnosisCode_{i}' for i in range(1, 11)]
-        existing_diagnosis = [col for col in diagnosis_cols if col in claims_df.columns]
-        
-        for col in existing_diagnosis:
-            if 'ClaimID' in claims_df.columns:
-                code_rel = claims_df[['ClaimID', col]].copy()
-                code_rel = code_rel.dropna(subset=[col])
-                code_rel = code_rel.rename(columns={'ClaimID': 'claim_id', col: 'code'})
-                code_rel['code_type'] = 'Diagnosis'
-                code_relationships.append(code_rel)
-        
-        # Procedure codes
-        procedure_cols = [f'ClmProcedureCode_{i}' for i in range(1, 7)]
-        existing_procedure = [col for col in procedure_cols if col in claims_df.columns]
-        
-        for col in existing_procedure:
-            if 'ClaimID' in claims_df.columns:
-                code_rel = claims_df[['ClaimID', col]].copy()
-                code_rel = code_rel.dropna(subset=[col])
-                code_rel = code_rel.rename(columns={'ClaimID': 'claim_id', col: 'code'})
-                code_rel['code_type'] = 'Procedure'
-                code_relationships.append(code_rel)
-        
-        if code_relationships:
-            includes_code = pd.concat(code_relationships, ignore_index=True)
-            relationships['INCLUDES_CODE'] = includes_code
-            print(f"  INCLUDES_CODE relationships: {len(includes_code)}")
+    relationships = build_relationships(claims_df)
+    for rel_name, rel_df in relationships.items():
+        print(f"  {rel_name} relationships: {len(rel_df)}")
     
     return relationships
 
+def save_table(df, basename, legacy_csv=False):
+    """Save a DataFrame as Parquet (and optionally CSV), returning the paths written"""
+    paths = []
+    if pa is not None:
+        path = OUTPUT_DIR / f"{basename}.parquet"
+        df.to_parquet(path, engine='pyarrow', compression='zstd', index=False)
+        paths.append(path)
+    
+    if legacy_csv or pa is None:
+        path = OUTPUT_DIR / f"{basename}.csv"
+        write_csv(df, path)
+        paths.append(path)
+    return paths
+
 def save_transformed_data(provider_nodes, beneficiary_nodes, claim_nodes, 
-                         physician_nodes, code_nodes, relationships):
-    """Save all transformed data to CSV files"""
+                         physician_nodes, code_nodes, relationships, legacy_csv=False):
+    """Save all transformed data as Parquet (and optionally CSV) files"""
     print("\nSaving transformed data...")
     
     # Save nodes
-    if provider_nodes is not None:
-        path = os.path.join(OUTPUT_DIR, "provider_nodes.csv")
-        provider_nodes.to_csv(path, index=False)
-        print(f"  Saved provider nodes to {path}")
-    
-    if beneficiary_nodes is not None:
-        path = os.path.join(OUTPUT_DIR, "beneficiary_nodes.csv")
-        beneficiary_nodes.to_csv(path, index=False)
-        print(f"  Saved beneficiary nodes to {path}")
-    
-    if claim_nodes is not None:
-        path = os.path.join(OUTPUT_DIR, "claim_nodes.csv")
-        claim_nodes.to_csv(path, index=False)
-        print(f"  Saved claim nodes to {path}")
-    
-    if physician_nodes is not None:
-        path = os.path.join(OUTPUT_DIR, "physician_nodes.csv")
-        physician_nodes.to_csv(path, index=False)
-        print(f"  Saved physician nodes to {path}")
-    
-    if code_nodes is not None:
-        path = os.path.join(OUTPUT_DIR, "medical_code_nodes.csv")
-        code_nodes.to_csv(path, index=False)
-        print(f"  Saved medical code nodes to {path}")
+    nodes = [
+        ("provider_nodes", "provider nodes", provider_nodes),
+        ("beneficiary_nodes", "beneficiary nodes", beneficiary_nodes),
+        ("claim_nodes", "claim nodes", claim_nodes),
+        ("physician_nodes", "physician nodes", physician_nodes),
+        ("medical_code_nodes", "medical code nodes", code_nodes)
+    ]
+    for basename, label, df in nodes:
+        if df is not None:
+            for path in save_table(df, basename, legacy_csv):
+                print(f"  Saved {label} to {path}")
     
     # Save relationships
     for rel_name, rel_df in relationships.items():
         if rel_df is not None:
-            path = os.path.join(OUTPUT_DIR, f"{rel_name.lower()}_relationships.csv")
-            rel_df.to_csv(path, index=False)
-            print(f"  Saved {rel_name} relationships to {path}")
+            for path in save_table(rel_df, f"{rel_name.lower()}_relationships", legacy_csv):
+                print(f"  Saved {rel_name} relationships to {path}")
 
-def main():
-    """Main execution function"""
+def append_table(writers, df, basename, legacy_csv=False):
+    """Append a chunk of rows to the Parquet (and optionally CSV) writers for basename"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if basename not in writers:
+        outputs = [pq.ParquetWriter(OUTPUT_DIR / f"{basename}.parquet", table.schema, compression='zstd')]
+        if legacy_csv:
+            outputs.append(pacsv.CSVWriter(OUTPUT_DIR / f"{basename}.csv", table.schema))
+        writers[basename] = (table.schema, outputs)
+    
+    # Later chunks can infer a looser type (e.g. an all-null column), so match the first chunk
+    schema, outputs = writers[basename]
+    table = table.cast(schema)
+    for writer in outputs:
+        writer.write_table(table)
+
+def stream_claims(legacy_csv=False):
+    """Transform the cleaned claim Parquet files one record batch at a time
+    
+    Claim nodes and relationships are appended to their output files chunk by
+    chunk, so the merged claims never need to be held in memory. Only the
+    distinct claim IDs, physicians and codes are kept across chunks.
+    
+    Returns (claim_count, relationship_counts, physician_nodes, code_nodes).
+    """
+    print("\nStreaming claims data...")
+    
+    writers = {}
+    seen_claims = set()
+    claim_count = 0
+    relationship_counts = {}
+    physician_chunks = []
+    code_chunks = [[], []]
+    
+    parquet_files = [pq.ParquetFile(PROCESSED_DATA_DIR / f"{basename}.parquet") for basename in CLAIM_FILES]
+    
+    # Columns missing from one claim type (e.g. admission dates for outpatient claims)
+    # are added as typed nulls, so every chunk has the same columns as the merged frame
+    claim_fields = {}
+    for basename, parquet_file in zip(CLAIM_FILES, parquet_files):
+        schema = parquet_file.schema_arrow
+        for col in cleaned_columns(basename.split('_')[0], schema.names):
+            claim_fields.setdefault(col, schema.field(col))
+    
+    try:
+        for type_code, parquet_file in enumerate(parquet_files):
+            columns = [col for col in claim_fields if col in parquet_file.schema_arrow.names]
+            print(f"  Processing {parquet_file.metadata.num_rows} {CLAIM_TYPES[type_code].lower()} claims...")
+            
+            for batch in parquet_file.iter_batches(batch_size=STREAM_BATCH_ROWS, columns=columns):
+                table = pa.Table.from_batches([batch])
+                for col, field in claim_fields.items():
+                    if col not in columns:
+                        table = table.append_column(field, pa.nulls(len(table), field.type))
+                claims = table.to_pandas(split_blocks=True, self_destruct=True)
+                claims['type'] = claim_type_column(len(claims), type_code)
+                
+                # Claim IDs already written by an earlier chunk are dropped like any other duplicate
+                claim_nodes = build_claim_nodes(claims)
+                claim_nodes = claim_nodes[~claim_nodes['id'].isin(seen_claims)]
+                seen_claims.update(claim_nodes['id'])
+                append_table(writers, claim_nodes, "claim_nodes", legacy_csv)
+                claim_count += len(claim_nodes)
+                
+                for rel_name, rel_df in build_relationships(claims).items():
+                    append_table(writers, rel_df, f"{rel_name.lower()}_relationships", legacy_csv)
+                    relationship_counts[rel_name] = relationship_counts.get(rel_name, 0) + len(rel_df)
+                
+                physician_cols = [col for col in ['AttendingPhysician', 'OperatingPhysician', 'OtherPhysician']
+                                  if col in claims.columns]
+                if physician_cols:
+                    physician_chunks.append(unique_values(claims, physician_cols))
+                for codes, chunk_codes in zip(code_chunks, unique_codes(claims)):
+                    codes.append(chunk_codes)
+    finally:
+        for _, outputs in writers.values():
+            for writer in outputs:
+                writer.close()
+    
+    print(f"  Claim nodes: {claim_count}")
+    for rel_name, count in relationship_counts.items():
+        print(f"  {rel_name} relationships: {count}")
+    
+    # Merge the per-chunk distinct values, keeping first-seen order
+    physician_nodes = None
+    if physician_chunks:
+        physician_nodes = pd.DataFrame({'id': string_column(pd.unique(np.concatenate(physician_chunks)))})
+    code_nodes = build_medical_code_nodes(
+        [pd.unique(np.concatenate(codes)) if codes else np.array([], dtype=str) for codes in code_chunks])
+    
+    return claim_count, relationship_counts, physician_nodes, code_nodes
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Transform the cleaned data into graph model files")
+    parser.add_argument(
+        "--legacy-csv",
+        action="store_true",
+        help="also write the node and relationship files as CSV"
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="process the claim files in record batches instead of loading them whole"
+    )
+    return parser.parse_args()
+
+def can_stream():
+    """Return True if the claim files can be streamed (pyarrow and cleaned Parquet claims present)"""
+    return pq is not None and all((PROCESSED_DATA_DIR / f"{basename}.parquet").exists()
+                                  for basename in CLAIM_FILES)
+
+def main(context=None, legacy_csv=False, streaming=False):
+    """Main execution function (context is passed through by the in-process pipeline runner)"""
     print("=" * 80)
     print("DATA TRANSFORMATION PIPELINE")
     print("=" * 80)
     
-    # Load cleaned data
-    dfs = load_cleaned_data()
-    
-    # Merge claims data
-    merged_claims = merge_claims_data(dfs.get('inpatient'), dfs.get('outpatient'))
+    if streaming and not can_stream():
+        print("WARNING: --streaming needs pyarrow and the cleaned claim Parquet files, "
+              "loading the claims in memory instead")
+        streaming = False
+    
+    # Reuse the frames produced by the cleansing step when run in-process,
+    # otherwise load the cleaned data files
+    if context and context.get('cleaned'):
+        print("Using cleaned data from the cleansing step")
+        dfs = context['cleaned']
+    elif streaming:
+        dfs = load_cleaned_data(['beneficiary', 'provider'])
+    else:
+        dfs = load_cleaned_data()
     
     # Prepare nodes
     provider_nodes = prepare_provider_nodes(dfs.get('provider'))
     beneficiary_nodes = prepare_beneficiary_nodes(dfs.get('beneficiary'))
-    claim_nodes = prepare_claim_nodes(merged_claims)
-    physician_nodes = extract_physician_nodes(merged_claims)
-    code_nodes = extract_medical_code_nodes(merged_claims)
     
-    # Create relationship mappings
-    relationships = create_relationship_mappings(merged_claims, provider_nodes, beneficiary_nodes)
+    if streaming:
+        # Claim nodes and relationships are written while streaming
+        claim_nodes = None
+        relationships = {}
+        claim_count, relationship_counts, physician_nodes, code_nodes = stream_claims(legacy_csv=legacy_csv)
+    else:
+        # Merge claims data
+        merged_claims = merge_claims_data(dfs.get('inpatient'), dfs.get('outpatient'))
+        
+        claim_nodes = prepare_claim_nodes(merged_claims)
+        physician_nodes = extract_physician_nodes(merged_claims)
+        code_nodes = extract_medical_code_nodes(merged_claims)
+        
+        # Create relationship mappings
+        relationships = create_relationship_mappings(merged_claims, provider_nodes, beneficiary_nodes)
+        claim_count = len(claim_nodes) if claim_nodes is not None else 0
+        relationship_counts = {rel_name: len(rel_df) for rel_name, rel_df in relationships.items()}
     
     # Save transformed data
     save_transformed_data(provider_nodes, beneficiary_nodes, claim_nodes, 
-                         physician_nodes, code_nodes, relationships)
+                         physician_nodes, code_nodes, relationships, legacy_csv=legacy_csv)
     
     print("\n" + "=" * 80)
     print("DATA TRANSFORMATION COMPLETE")
@@ -369,11 +633,14 @@ def main():
     print("\nSummary:")
     print(f"  Provider nodes: {len(provider_nodes) if provider_nodes is not None else 0}")
     print(f"  Beneficiary nodes: {len(beneficiary_nodes) if beneficiary_nodes is not None else 0}")
-    print(f"  Claim nodes: {len(claim_nodes) if claim_nodes is not None else 0}")
+    print(f"  Claim nodes: {claim_count}")
     print(f"  Physician nodes: {len(physician_nodes) if physician_nodes is not None else 0}")
     print(f"  Medical code nodes: {len(code_nodes) if code_nodes is not None else 0}")
-    print(f"  Relationship types: {len(relationships)}")
+    print(f"  Relationship types: {len(relationship_counts)}")
+    
+    return context
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(legacy_csv=args.legacy_csv, streaming=args.streaming)
 
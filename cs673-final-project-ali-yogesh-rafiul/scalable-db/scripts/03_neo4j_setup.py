@@ -1,29 +1,30 @@
 """
 Neo4j Database Setup Script
 Creates database, indexes, and constraints
+
+The constraints are created before loading on purpose: the relationship
+loads (05_load_relationships, and the fused claim load in 04_load_nodes)
+MATCH their endpoints on the node IDs in transactional batches, so the
+backing indexes must exist (and be online) first. For large loads, also
+make sure db.memory.transaction.total.max in neo4j.conf leaves room for a
+full batch.
 """
 import sys
 import os
-from neo4j import GraphDatabase
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.neo4j_config import get_neo4j_config
+from scripts._driver import get_driver
 
 def connect_to_neo4j():
     """Connect to Neo4j database"""
     config = get_neo4j_config()
     
     try:
-        driver = GraphDatabase.driver(
-            config["uri"],
-            auth=(config["user"], config["password"]),
-            connection_timeout=config["connection_timeout"]
-        )
-        
-        # Test connection
-        driver.verify_connectivity()
+        # Connects and tests the connection the first time
+        driver = get_driver(config)
         print(f"✓ Connected to Neo4j at {config['uri']}")
         return driver, config
     except Exception as e:
@@ -78,8 +79,50 @@ def create_database(driver, config):
         print(f"  ⚠ Could not access system database: {e}")
         print(f"  Will attempt to use database '{config['database']}' anyway")
 
+def constraint_cypher(constraint_name, node_type, prop):
+    """Build the CREATE CONSTRAINT statement for a node ID property"""
+    return f"""
+    CREATE CONSTRAINT {constraint_name} IF NOT EXISTS
+    FOR (n:{node_type})
+    REQUIRE n.{prop} IS UNIQUE
+    """
+
+def create_constraint_batch(tx, missing):
+    """Create several constraints inside one write transaction"""
+    for constraint_name, node_type, prop in missing:
+        tx.run(constraint_cypher(constraint_name, node_type, prop)).consume()
+
+def create_constraint(session, constraint_name, node_type, prop):
+    """Create a single constraint, tolerating an existing index on the property"""
+    try:
+        session.run(constraint_cypher(constraint_name, node_type, prop)).consume()
+        print(f"  ✓ Created uniqueness constraint on {node_type}.{prop}")
+        return True
+    except Exception as e:
+        error_str = str(e)
+        error_msg = error_str.lower()
+        # Check for IndexAlreadyExists error (case-insensitive check in original string)
+        is_index_error = (
+            "IndexAlreadyExists" in error_str or
+            "index already exists" in error_msg or 
+            "already exists an index" in error_msg
+        )
+        
+        if is_index_error:
+            # Index exists - this is fine, index provides performance benefit
+            # Note: For true uniqueness enforcement, you'd need to drop index first
+            # But for this project, the index is sufficient
+            print(f"  ⚠ Index already exists for {node_type}.{prop} (skipping constraint)")
+            print(f"     Index provides performance - uniqueness enforced by application logic")
+        else:
+            print(f"  ✗ Failed to create constraint on {node_type}.{prop}: {e}")
+        return False
+
 def create_constraints(driver, config):
-    """Create uniqueness constraints on node ID properties (constraints auto-create indexes)"""
+    """
+    Create uniqueness constraints on node ID properties (constraints auto-create indexes)
+    Returns the names of all constraints in the database, or None if they could not be listed
+    """
     print("\nCreating constraints (indexes will be created automatically)...")
     
     constraints = [
@@ -91,55 +134,56 @@ def create_constraints(driver, config):
     ]
     
     with driver.session(database=config['database']) as session:
+        # Fetch the existing constraint names once and check them locally
+        try:
+            existing = {record['name'] for record in session.run("SHOW CONSTRAINTS YIELD name")}
+        except Exception:
+            # If SHOW CONSTRAINTS fails, try to create all of them anyway
+            existing = None
+        
+        missing = []
         for node_type, prop in constraints:
             constraint_name = f"{node_type.lower()}_{prop}_unique"
             
             # Check if constraint already exists
-            try:
-                result = session.run("""
-                    SHOW CONSTRAINTS
-                    YIELD name
-                    WHERE name = $constraint_name
-                    RETURN name
-                """, constraint_name=constraint_name)
-                
-                if result.single() is not None:
-                    print(f"  ✓ Constraint on {node_type}.{prop} already exists")
-                    continue
-            except Exception:
-                # If SHOW CONSTRAINTS fails, try to create anyway
-                pass
-            
-            # Try to create constraint
-            try:
-                cypher = f"""
-                CREATE CONSTRAINT {constraint_name} IF NOT EXISTS
-                FOR (n:{node_type})
-                REQUIRE n.{prop} IS UNIQUE
-                """
-                session.run(cypher)
+            if existing is not None and constraint_name in existing:
+                print(f"  ✓ Constraint on {node_type}.{prop} already exists")
+            else:
+                missing.append((constraint_name, node_type, prop))
+        
+        if not missing:
+            return existing
+        
+        # Create all missing constraints under a single commit
+        try:
+            session.execute_write(create_constraint_batch, missing)
+            created = [constraint_name for constraint_name, _, _ in missing]
+            for _, node_type, prop in missing:
                 print(f"  ✓ Created uniqueness constraint on {node_type}.{prop}")
-            except Exception as e:
-                error_str = str(e)
-                error_msg = error_str.lower()
-                # Check for IndexAlreadyExists error (case-insensitive check in original string)
-                is_index_error = (
-                    "IndexAlreadyExists" in error_str or
-                    "index already exists" in error_msg or 
-                    "already exists an index" in error_msg
-                )
-                
-                if is_index_error:
-                    # Index exists - this is fine, index provides performance benefit
-                    # Note: For true uniqueness enforcement, you'd need to drop index first
-                    # But for this project, the index is sufficient
-                    print(f"  ⚠ Index already exists for {node_type}.{prop} (skipping constraint)")
-                    print(f"     Index provides performance - uniqueness enforced by application logic")
-                else:
-                    print(f"  ✗ Failed to create constraint on {node_type}.{prop}: {e}")
+        except Exception as e:
+            # One failure rolls back the whole batch, so retry one at a time
+            print(f"  ⚠ Batched constraint creation failed, creating one at a time: {e}")
+            created = [constraint_name for constraint_name, node_type, prop in missing
+                       if create_constraint(session, constraint_name, node_type, prop)]
+        
+        if existing is not None:
+            existing.update(created)
+    
+    return existing
+
+def wait_for_indexes(driver, config):
+    """Block until all indexes are online, so the loaders don't wait on index population"""
+    print("\nWaiting for indexes to come online...")
+    
+    try:
+        with driver.session(database=config['database']) as session:
+            session.run("CALL db.awaitIndexes($timeout)", timeout=config['query_timeout']).consume()
+        print("  ✓ All indexes online")
+    except Exception as e:
+        print(f"  ⚠ Could not wait for indexes: {e}")
 
-def verify_setup(driver, config):
-    """Verify indexes and constraints were created"""
+def verify_setup(driver, config, constraints=None):
+    """Verify indexes and constraints were created (reuses the constraint names when given)"""
     print("\nVerifying setup...")
     
     with driver.session(database=config['database']) as session:
@@ -149,14 +193,15 @@ def verify_setup(driver, config):
         print(f"  Found {len(indexes)} indexes")
         
         # Check constraints
-        result = session.run("SHOW CONSTRAINTS")
-        constraints = [record['name'] for record in result]
+        if constraints is None:
+            result = session.run("SHOW CONSTRAINTS")
+            constraints = [record['name'] for record in result]
         print(f"  Found {len(constraints)} constraints")
         
         return len(indexes) > 0 and len(constraints) > 0
 
-def main():
-    """Main execution function"""
+def main(context=None):
+    """Main execution function (context is passed through by the in-process pipeline runner)"""
     print("=" * 80)
     print("NEO4J DATABASE SETUP")
     print("=" * 80)
@@ -169,10 +214,11 @@ def main():
         create_database(driver, config)
         
         # Create constraints (they automatically create indexes)
-        create_constraints(driver, config)
+        constraints = create_constraints(driver, config)
+        wait_for_indexes(driver, config)
         
         # Verify setup
-        if verify_setup(driver, config):
+        if verify_setup(driver, config, constraints):
             print("\n" + "=" * 80)
             print("✓ NEO4J SETUP COMPLETE")
             print("=" * 80)
@@ -181,11 +227,11 @@ def main():
             print("⚠ SETUP COMPLETE WITH WARNINGS")
             print("=" * 80)
         
-        driver.close()
-        
     except Exception as e:
         print(f"\n✗ Setup failed: {e}")
         sys.exit(1)
+    
+    return context
 
 if __name__ == "__main__":
     main()
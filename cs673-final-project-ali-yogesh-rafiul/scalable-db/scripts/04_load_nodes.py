@@ -5,134 +5,127 @@ Loads all node types into Neo4j in batches
 import sys
 import os
 import pandas as pd
-import numpy as np
-from neo4j import GraphDatabase
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.neo4j_config import get_neo4j_config
+from scripts._driver import get_driver
+from scripts._batching import chunk_rows, load_batches
+from scripts._io import iter_processed, to_plain_values
 
-PROCESSED_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "processed")
+# Columns read by each CREATE clause below, so no other column is parsed or sent
+# (Beneficiary has none: SET b = record stores every column of its file)
+NODE_COLUMNS = {
+    "Provider": ['id', 'isFraud'],
+    "Claim": ['id', 'type', 'totalCost', 'claimStartDate', 'claimEndDate', 'admissionDate',
+              'dischargeDate', 'reimbursedAmount', 'deductibleAmount'],
+    "Physician": ['id'],
+    "MedicalCode": ['code', 'type']
+}
 
-def load_nodes_batch(driver, config, node_type, df, batch_size=1000):
-    """Load nodes in batches using UNWIND"""
-    if df is None or len(df) == 0:
-        print(f"  No {node_type} nodes to load")
+def load_nodes_batch(driver, config, node_type, chunks, batch_size=None, prepare_chunk=None):
+    """
+    Load nodes in batches using UNWIND (batches run concurrently on a worker pool)
+    The input is an iterable of DataFrame chunks, each passed through prepare_chunk
+    (if given) and loaded before the next one is read.
+    """
+    # Build the CREATE clause based on node type
+    if node_type == "Provider":
+        create = """
+        CREATE (p:Provider {
+            id: record.id,
+            isFraud: record.isFraud
+        })
+        """
+    elif node_type == "Beneficiary":
+        create = """
+        CREATE (b:Beneficiary)
+        SET b = record
+        """
+    elif node_type == "Claim":
+        create = """
+        CREATE (c:Claim {
+            id: record.id,
+            type: record.type,
+            totalCost: record.totalCost,
+            claimStartDate: record.claimStartDate,
+            claimEndDate: record.claimEndDate,
+            admissionDate: record.admissionDate,
+            dischargeDate: record.dischargeDate,
+            reimbursedAmount: record.reimbursedAmount,
+            deductibleAmount: record.deductibleAmount
+        })
+        """
+    elif node_type == "Physician":
+        create = """
+        CREATE (p:Physician {
+            id: record.id
+        })
+        """
+    elif node_type == "MedicalCode":
+        create = """
+        CREATE (m:MedicalCode {
+            code: record.code,
+            type: record.type
+        })
+        """
+    else:
+        print(f"  Unknown node type: {node_type}")
         return 0
     
+    # With NEO4J_SERVER_BATCH_SIZE the server commits every N rows of a (larger) client
+    # batch itself; CALL ... IN TRANSACTIONS needs an auto-commit transaction
+    server_batch_size = config['server_batch_size']
+    if server_batch_size:
+        cypher = f"""
+        UNWIND $records AS record
+        CALL {{
+            WITH record
+            {create.strip()}
+        }} IN TRANSACTIONS OF {server_batch_size} ROWS
+        """
+    else:
+        cypher = "\n        UNWIND $records AS record" + create
+    
     print(f"\nLoading {node_type} nodes...")
-    print(f"  Total records: {len(df)}")
     
+    total_records = 0
     total_loaded = 0
-    num_batches = (len(df) + batch_size - 1) // batch_size
+    for df in chunks:
+        if len(df) == 0:
+            continue
+        if prepare_chunk is not None:
+            df = prepare_chunk(df)
+        
+        # New nodes don't lock each other, so every batch is an independent task
+        total_records += len(df)
+        total_loaded += load_batches(driver, config, df, cypher, "nodes", batch_size,
+                                     auto_commit=bool(server_batch_size))
+        print(f"  Records read: {total_records} (Loaded: {total_loaded})")
     
-    with driver.session(database=config['database']) as session:
-        for i in range(0, len(df), batch_size):
-            batch = df[i:i+batch_size]
-            batch_num = (i // batch_size) + 1
-            
-            # Convert DataFrame to list of dictionaries
-            records = batch.to_dict('records')
-            
-            # Build Cypher query based on node type
-            if node_type == "Provider":
-                cypher = """
-                UNWIND $records AS record
-                CREATE (p:Provider {
-                    id: record.id,
-                    isFraud: record.isFraud
-                })
-                """
-            elif node_type == "Beneficiary":
-                # Process records to handle NaN values and types
-                processed_records = []
-                for rec in records:
-                    processed = {}
-                    for key, value in rec.items():
-                        if pd.isna(value):
-                            processed[key] = None
-                        elif isinstance(value, (pd.Timestamp, pd.Timedelta)):
-                            processed[key] = str(value)
-                        elif isinstance(value, (np.integer, np.floating)):
-                            processed[key] = value.item()
-                        else:
-                            processed[key] = value
-                    processed_records.append(processed)
-                records = processed_records
-                
-                cypher = """
-                UNWIND $records AS record
-                CREATE (b:Beneficiary)
-                SET b = record
-                """
-            elif node_type == "Claim":
-                cypher = """
-                UNWIND $records AS record
-                CREATE (c:Claim {
-                    id: record.id,
-                    type: record.type,
-                    totalCost: toFloat(record.totalCost),
-                    claimStartDate: record.claimStartDate,
-                    claimEndDate: record.claimEndDate,
-                    admissionDate: record.admissionDate,
-                    dischargeDate: record.dischargeDate,
-                    reimbursedAmount: toFloat(record.reimbursedAmount),
-                    deductibleAmount: toFloat(record.deductibleAmount)
-                })
-                """
-            elif node_type == "Physician":
-                cypher = """
-                UNWIND $records AS record
-                CREATE (p:Physician {
-                    id: record.id
-                })
-                """
-            elif node_type == "MedicalCode":
-                cypher = """
-                UNWIND $records AS record
-                CREATE (m:MedicalCode {
-                    code: record.code,
-                    type: record.type
-                })
-                """
-            else:
-                print(f"  Unknown node type: {node_type}")
-                return 0
-            
-            try:
-                result = session.run(cypher, records=records)
-                result.consume()  # Consume result to execute
-                total_loaded += len(batch)
-                print(f"  Batch {batch_num}/{num_batches}: Loaded {len(batch)} nodes (Total: {total_loaded})")
-            except Exception as e:
-                print(f"  ✗ Error loading batch {batch_num}: {e}")
-                # Try to continue with next batch
-                continue
+    if total_records == 0:
+        print(f"  No {node_type} nodes to load")
+        return 0
     
     print(f"  ✓ Loaded {total_loaded} {node_type} nodes")
     return total_loaded
 
+def prepare_provider_chunk(df):
+    """Ensure isFraud is integer"""
+    df['isFraud'] = df['isFraud'].astype(int)
+    return df
+
 def load_provider_nodes(driver, config):
     """Load Provider nodes"""
-    filepath = os.path.join(PROCESSED_DATA_DIR, "provider_nodes.csv")
-    if not os.path.exists(filepath):
-        print(f"  File not found: {filepath}")
+    chunks = iter_processed("provider_nodes", chunk_rows(config), NODE_COLUMNS["Provider"])
+    if chunks is None:
         return 0
     
-    df = pd.read_csv(filepath)
-    # Ensure isFraud is integer
-    df['isFraud'] = df['isFraud'].astype(int)
-    return load_nodes_batch(driver, config, "Provider", df)
+    return load_nodes_batch(driver, config, "Provider", chunks, prepare_chunk=prepare_provider_chunk)
 
-def load_beneficiary_nodes(driver, config):
-    """Load Beneficiary nodes"""
-    filepath = os.path.join(PROCESSED_DATA_DIR, "beneficiary_nodes.csv")
-    if not os.path.exists(filepath):
-        print(f"  File not found: {filepath}")
-        return 0
-    
-    df = pd.read_csv(filepath)
+def prepare_beneficiary_chunk(df):
+    """Convert dates, fill missing locations and turn the values into plain Python values"""
     # Convert date columns if they exist
     date_cols = ['DOB', 'DOD']
     for col in date_cols:
@@ -142,49 +135,141 @@ def load_beneficiary_nodes(driver, config):
     # Fill NaN values appropriately
     df = df.fillna({'State': 'UNKNOWN', 'County': 'UNKNOWN'})
     
-    return load_nodes_batch(driver, config, "Beneficiary", df)
+    # SET b = record stores every column, so every value must be a plain Python value
+    return to_plain_values(df)
 
-def load_claim_nodes(driver, config):
-    """Load Claim nodes"""
-    filepath = os.path.join(PROCESSED_DATA_DIR, "claim_nodes.csv")
-    if not os.path.exists(filepath):
-        print(f"  File not found: {filepath}")
+def load_beneficiary_nodes(driver, config):
+    """Load Beneficiary nodes"""
+    chunks = iter_processed("beneficiary_nodes", chunk_rows(config))
+    if chunks is None:
         return 0
     
-    df = pd.read_csv(filepath, parse_dates=True, low_memory=False)
+    return load_nodes_batch(driver, config, "Beneficiary", chunks, prepare_chunk=prepare_beneficiary_chunk)
+
+def prepare_claim_chunk(df):
+    """Convert the date columns and fill missing amounts as floats"""
     # Convert date columns
     date_cols = ['claimStartDate', 'claimEndDate', 'admissionDate', 'dischargeDate']
     for col in date_cols:
         if col in df.columns:
             df[col] = pd.to_datetime(df[col], errors='coerce')
     
-    # Fill NaN numeric values
+    # Fill NaN numeric values and send them as floats (the Cypher stores them as given)
     numeric_cols = ['totalCost', 'reimbursedAmount', 'deductibleAmount']
     for col in numeric_cols:
         if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype('float64')
+    return df
+
+def read_claim_links(config, basename, column):
+    """
+    Read a claim relationship file as a claim_id -> column Series
+    Returns None if the file is missing or a claim has more than one row.
+    """
+    chunks = iter_processed(basename, chunk_rows(config), ['claim_id', column])
+    if chunks is None:
+        return None
     
-    return load_nodes_batch(driver, config, "Claim", df)
+    frames = [chunk[['claim_id', column]] for chunk in chunks]
+    links = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['claim_id', column])
+    if not links['claim_id'].is_unique:
+        return None
+    return links.set_index('claim_id')[column]
+
+def load_claims_with_relationships(driver, config):
+    """
+    Load Claim nodes together with their FILED and HAS_CLAIM relationships
+    Each claim row carries its provider and beneficiary ID, so the relationships are
+    created in the same statement instead of matching every claim again in the
+    relationship step. Returns None if the links are not one row per claim.
+    """
+    providers = read_claim_links(config, "filed_relationships", "provider_id")
+    beneficiaries = read_claim_links(config, "has_claim_relationships", "beneficiary_id")
+    if providers is None or beneficiaries is None:
+        return None
+    
+    chunks = iter_processed("claim_nodes", chunk_rows(config), NODE_COLUMNS["Claim"])
+    if chunks is None:
+        return 0
+    
+    # Unit subqueries keep claims whose provider or beneficiary is missing, like the separate loads
+    cypher = """
+    UNWIND $records AS record
+    CREATE (c:Claim {
+        id: record.id,
+        type: record.type,
+        totalCost: record.totalCost,
+        claimStartDate: record.claimStartDate,
+        claimEndDate: record.claimEndDate,
+        admissionDate: record.admissionDate,
+        dischargeDate: record.dischargeDate,
+        reimbursedAmount: record.reimbursedAmount,
+        deductibleAmount: record.deductibleAmount
+    })
+    WITH c, record
+    CALL {
+        WITH c, record
+        MATCH (p:Provider {id: record.provider_id})
+        CREATE (p)-[:FILED]->(c)
+    }
+    CALL {
+        WITH c, record
+        MATCH (b:Beneficiary {id: record.beneficiary_id})
+        CREATE (b)-[:HAS_CLAIM]->(c)
+    }
+    """
+    
+    print("\nLoading Claim nodes with FILED and HAS_CLAIM relationships...")
+    
+    total_records = 0
+    total_loaded = 0
+    for df in chunks:
+        if len(df) == 0:
+            continue
+        df = prepare_claim_chunk(df)
+        for column, links in [('provider_id', providers), ('beneficiary_id', beneficiaries)]:
+            ids = df['id'].map(links)
+            df[column] = ids.astype(object).where(ids.notna(), None)
+        
+        # Many claims share a provider, so partition on it to keep concurrent batches apart;
+        # partitions still share beneficiaries, so take those in beneficiary_id order (no deadlock cycles)
+        total_records += len(df)
+        total_loaded += load_batches(driver, config, df, cypher, "nodes", partition_column='provider_id',
+                                     order_column='beneficiary_id')
+        print(f"  Records read: {total_records} (Loaded: {total_loaded})")
+    
+    print(f"  ✓ Loaded {total_loaded} Claim nodes with their FILED and HAS_CLAIM relationships")
+    return total_loaded
+
+def load_claim_nodes(driver, config):
+    """Load Claim nodes (with FILED and HAS_CLAIM when NEO4J_FUSE_CLAIM_RELATIONSHIPS is set)"""
+    if config['fuse_claim_relationships']:
+        loaded = load_claims_with_relationships(driver, config)
+        if loaded is not None:
+            return loaded
+        print("\n⚠ FILED/HAS_CLAIM links are not one row per claim, loading Claim nodes on their own")
+    
+    chunks = iter_processed("claim_nodes", chunk_rows(config), NODE_COLUMNS["Claim"])
+    if chunks is None:
+        return 0
+    
+    return load_nodes_batch(driver, config, "Claim", chunks, prepare_chunk=prepare_claim_chunk)
 
 def load_physician_nodes(driver, config):
     """Load Physician nodes"""
-    filepath = os.path.join(PROCESSED_DATA_DIR, "physician_nodes.csv")
-    if not os.path.exists(filepath):
-        print(f"  File not found: {filepath}")
+    chunks = iter_processed("physician_nodes", chunk_rows(config), NODE_COLUMNS["Physician"])
+    if chunks is None:
         return 0
     
-    df = pd.read_csv(filepath)
-    return load_nodes_batch(driver, config, "Physician", df)
+    return load_nodes_batch(driver, config, "Physician", chunks)
 
 def load_medical_code_nodes(driver, config):
     """Load MedicalCode nodes"""
-    filepath = os.path.join(PROCESSED_DATA_DIR, "medical_code_nodes.csv")
-    if not os.path.exists(filepath):
-        print(f"  File not found: {filepath}")
+    chunks = iter_processed("medical_code_nodes", chunk_rows(config), NODE_COLUMNS["MedicalCode"])
+    if chunks is None:
         return 0
     
-    df = pd.read_csv(filepath)
-    return load_nodes_batch(driver, config, "MedicalCode", df)
+    return load_nodes_batch(driver, config, "MedicalCode", chunks)
 
 def verify_node_counts(driver, config):
     """Verify node counts in database"""
@@ -192,15 +277,17 @@ def verify_node_counts(driver, config):
     
     node_types = ["Provider", "Beneficiary", "Claim", "Physician", "MedicalCode"]
     
+    # One round trip for all labels (each branch is still answered from the count store)
+    cypher = " UNION ALL ".join(
+        f"MATCH (n:{node_type}) RETURN '{node_type}' AS type, count(n) AS count" for node_type in node_types
+    )
+    
     with driver.session(database=config['database']) as session:
-        for node_type in node_types:
-            cypher = f"MATCH (n:{node_type}) RETURN count(n) AS count"
-            result = session.run(cypher)
-            count = result.single()['count']
-            print(f"  {node_type}: {count} nodes")
-
-def main():
-    """Main execution function"""
+        for record in session.run(cypher):
+            print(f"  {record['type']}: {record['count']} nodes")
+
+def main(context=None):
+    """Main execution function (context is passed through by the in-process pipeline runner)"""
     print("=" * 80)
     print("NODE LOADING PIPELINE")
     print("=" * 80)
@@ -208,12 +295,7 @@ def main():
     try:
         # Connect to Neo4j
         config = get_neo4j_config()
-        driver = GraphDatabase.driver(
-            config["uri"],
-            auth=(config["user"], config["password"]),
-            connection_timeout=config["connection_timeout"]
-        )
-        driver.verify_connectivity()
+        driver = get_driver(config)
         print(f"✓ Connected to Neo4j at {config['uri']}\n")
         
         # Load nodes in order
@@ -237,13 +319,13 @@ def main():
             print(f"  {node_type}: {count}")
         print("=" * 80)
         
-        driver.close()
-        
     except Exception as e:
         print(f"\n✗ Node loading failed: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    
+    return context
 
 if __name__ == "__main__":
     main()
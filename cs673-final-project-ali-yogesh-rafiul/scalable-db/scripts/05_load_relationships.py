@@ -4,127 +4,236 @@ Creates all relationship types in Neo4j
 """
 import sys
 import os
-import pandas as pd
-from neo4j import GraphDatabase
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.neo4j_config import get_neo4j_config
+from scripts._driver import get_driver
+from scripts._batching import chunk_rows, load_batches
+from scripts._indexes import ensure_indexes
+from scripts._io import iter_processed
 
-PROCESSED_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "processed")
+# Node lookups done by the relationship MATCH clauses (label, property); the setup step's
+# uniqueness constraints normally provide these, and without them each lookup would be a label scan
+LOOKUP_INDEXES = [
+    ("Provider", "id"),
+    ("Beneficiary", "id"),
+    ("Claim", "id"),
+    ("Physician", "id"),
+    ("MedicalCode", "code")
+]
 
-def load_relationships_batch(driver, config, rel_type, df, batch_size=1000):
-    """Load relationships in batches using UNWIND"""
-    if df is None or len(df) == 0:
-        print(f"  No {rel_type} relationships to load")
+# Columns read by each relationship statement below, so no other column is parsed or sent
+RELATIONSHIP_COLUMNS = {
+    "FILED": ['provider_id', 'claim_id'],
+    "HAS_CLAIM": ['beneficiary_id', 'claim_id'],
+    "ATTENDED_BY": ['claim_id', 'physician_id', 'physician_type'],
+    "INCLUDES_CODE": ['claim_id', 'code']
+}
+
+def clear_staging(driver, config, staging_label):
+    """Delete all staged rows with the given label, in batches; returns how many there were"""
+    with driver.session(database=config['database']) as session:
+        record = session.run("""
+        CALL apoc.periodic.iterate($outer, 'DELETE s', {batchSize: $batch_size})
+        YIELD total
+        RETURN total
+        """,
+            outer=f"MATCH (s:{staging_label}) RETURN s",
+            batch_size=config['batch_size']
+        ).single()
+    return record['total']
+
+def create_staged_relationships(driver, config, rel_type, cypher, staging_label, order_column):
+    """
+    Create relationships from staged rows with apoc.periodic.iterate, deleting each row as it is used
+    The server runs the batches itself, in parallel; rows are taken in order of the
+    shared endpoint so concurrent batches mostly lock different nodes. Rows left over
+    (a missing endpoint, or a failed batch) are deleted afterwards, so a later run
+    never creates their relationships a second time.
+    """
+    inner = cypher.replace("UNWIND $records AS record", "WITH s, s AS record", 1) + "DELETE s"
+    
+    with driver.session(database=config['database']) as session:
+        record = session.run("""
+        CALL apoc.periodic.iterate($outer, $inner, {
+            batchSize: $batch_size, parallel: true, concurrency: $concurrency, retries: 3
+        })
+        YIELD total, failedOperations, errorMessages, updateStatistics
+        RETURN total, failedOperations, errorMessages, updateStatistics
+        """,
+            outer=f"MATCH (s:{staging_label}) RETURN s ORDER BY s.{order_column}",
+            inner=inner,
+            batch_size=config['batch_size'],
+            concurrency=max(1, config['load_workers'])
+        ).single()
+    
+    if record['failedOperations']:
+        print(f"  ✗ {record['failedOperations']} of {record['total']} staged {rel_type} rows failed: "
+              f"{record['errorMessages']}")
+    
+    unmatched = clear_staging(driver, config, staging_label)
+    if unmatched:
+        print(f"  ⚠ {unmatched} staged {rel_type} rows were not loaded (missing endpoint or failed batch)")
+    return record['updateStatistics'].get('relationshipsCreated', 0)
+
+def load_relationships_batch(driver, config, rel_type, chunks, batch_size=None, prepare_chunk=None):
+    """
+    Load relationships in batches using UNWIND (partitions run concurrently on a worker pool)
+    The input is an iterable of DataFrame chunks, each passed through prepare_chunk
+    (if given) and loaded before the next one is read. With use_apoc_iterate the
+    chunks are only staged as nodes, and the relationships are created on the server.
+    """
+    # Build Cypher query based on relationship type; rows are partitioned on the
+    # endpoint shared by many rows, so concurrent batches don't contend for its locks.
+    # A claim has several physicians and codes, so those partitions can still share
+    # claims - they are taken in claim_id order to avoid lock-order deadlocks
+    order_column = None
+    if rel_type == "FILED":
+        partition_column = 'provider_id'
+        cypher = """
+        UNWIND $records AS record
+        MATCH (p:Provider {id: record.provider_id})
+        MATCH (c:Claim {id: record.claim_id})
+        CREATE (p)-[:FILED]->(c)
+        """
+    elif rel_type == "HAS_CLAIM":
+        partition_column = 'beneficiary_id'
+        cypher = """
+        UNWIND $records AS record
+        MATCH (b:Beneficiary {id: record.beneficiary_id})
+        MATCH (c:Claim {id: record.claim_id})
+        CREATE (b)-[:HAS_CLAIM]->(c)
+        """
+    elif rel_type == "ATTENDED_BY":
+        partition_column = 'physician_id'
+        order_column = 'claim_id'
+        cypher = """
+        UNWIND $records AS record
+        MATCH (c:Claim {id: record.claim_id})
+        MATCH (p:Physician {id: record.physician_id})
+        CREATE (c)-[:ATTENDED_BY {type: record.physician_type}]->(p)
+        """
+    elif rel_type == "INCLUDES_CODE":
+        partition_column = 'code'
+        order_column = 'claim_id'
+        cypher = """
+        UNWIND $records AS record
+        MATCH (c:Claim {id: record.claim_id})
+        MATCH (m:MedicalCode {code: record.code})
+        CREATE (c)-[:INCLUDES_CODE]->(m)
+        """
+    else:
+        print(f"  Unknown relationship type: {rel_type}")
         return 0
     
     print(f"\nLoading {rel_type} relationships...")
-    print(f"  Total records: {len(df)}")
     
+    use_apoc = config['use_apoc_iterate']
+    staging_label = f"_Staging_{rel_type}"
+    staging_cypher = f"""
+        UNWIND $records AS record
+        CREATE (s:{staging_label})
+        SET s = record
+        """
+    
+    if use_apoc:
+        # Rows staged by an earlier run that crashed were never used; drop them, not reload them
+        stale = clear_staging(driver, config, staging_label)
+        if stale:
+            print(f"  ⚠ Removed {stale} stale staged {rel_type} rows from an earlier run")
+    
+    total_records = 0
     total_loaded = 0
-    num_batches = (len(df) + batch_size - 1) // batch_size
+    for df in chunks:
+        if len(df) == 0:
+            continue
+        if prepare_chunk is not None:
+            df = prepare_chunk(df)
+        
+        total_records += len(df)
+        if use_apoc:
+            # Staging is create-only, so batches need no partitioning
+            total_loaded += load_batches(driver, config, df, staging_cypher, "staging", batch_size)
+            print(f"  Records read: {total_records} (Staged: {total_loaded})")
+            continue
+        total_loaded += load_batches(driver, config, df, cypher, "relationships", batch_size,
+                                     partition_column=partition_column, order_column=order_column)
+        print(f"  Records read: {total_records} (Loaded: {total_loaded})")
     
-    with driver.session(database=config['database']) as session:
-        for i in range(0, len(df), batch_size):
-            batch = df[i:i+batch_size]
-            batch_num = (i // batch_size) + 1
-            
-            # Convert DataFrame to list of dictionaries
-            records = batch.to_dict('records')
-            
-            # Build Cypher query based on relationship type
-            if rel_type == "FILED":
-                cypher = """
-                UNWIND $records AS record
-                MATCH (p:Provider {id: record.provider_id})
-                MATCH (c:Claim {id: record.claim_id})
-                CREATE (p)-[:FILED]->(c)
-                """
-            elif rel_type == "HAS_CLAIM":
-                cypher = """
-                UNWIND $records AS record
-                MATCH (b:Beneficiary {id: record.beneficiary_id})
-                MATCH (c:Claim {id: record.claim_id})
-                CREATE (b)-[:HAS_CLAIM]->(c)
-                """
-            elif rel_type == "ATTENDED_BY":
-                cypher = """
-                UNWIND $records AS record
-                MATCH (c:Claim {id: record.claim_id})
-                MATCH (p:Physician {id: record.physician_id})
-                CREATE (c)-[:ATTENDED_BY {type: record.physician_type}]->(p)
-                """
-            elif rel_type == "INCLUDES_CODE":
-                cypher = """
-                UNWIND $records AS record
-                MATCH (c:Claim {id: record.claim_id})
-                MATCH (m:MedicalCode {code: record.code})
-                CREATE (c)-[:INCLUDES_CODE]->(m)
-                """
-            else:
-                print(f"  Unknown relationship type: {rel_type}")
-                return 0
-            
-            try:
-                result = session.run(cypher, records=records)
-                result.consume()  # Consume result to execute
-                total_loaded += len(batch)
-                print(f"  Batch {batch_num}/{num_batches}: Loaded {len(batch)} relationships (Total: {total_loaded})")
-            except Exception as e:
-                print(f"  ✗ Error loading batch {batch_num}: {e}")
-                # Try to continue with next batch
-                continue
+    if total_records == 0:
+        print(f"  No {rel_type} relationships to load")
+        return 0
+    
+    if use_apoc:
+        total_loaded = create_staged_relationships(driver, config, rel_type, cypher, staging_label,
+                                                   partition_column)
     
     print(f"  ✓ Loaded {total_loaded} {rel_type} relationships")
     return total_loaded
 
+def loaded_with_claims(driver, config, rel_type):
+    """Return True if rel_type was already created together with the Claim nodes"""
+    if not config['fuse_claim_relationships']:
+        return False
+    
+    with driver.session(database=config['database']) as session:
+        # Answered from the counts store, no scan
+        count = session.run(f"MATCH ()-[r:{rel_type}]->() RETURN count(r) AS count").single()['count']
+    if count > 0:
+        print(f"\n{rel_type} relationships were loaded with the Claim nodes ({count}), skipping")
+        return True
+    return False
+
 def load_filed_relationships(driver, config):
     """Load FILED relationships (Provider -> Claim)"""
-    filepath = os.path.join(PROCESSED_DATA_DIR, "filed_relationships.csv")
-    if not os.path.exists(filepath):
-        print(f"  File not found: {filepath}")
+    if loaded_with_claims(driver, config, "FILED"):
+        return 0
+    
+    chunks = iter_processed("filed_relationships", chunk_rows(config), RELATIONSHIP_COLUMNS["FILED"])
+    if chunks is None:
         return 0
     
-    df = pd.read_csv(filepath)
-    return load_relationships_batch(driver, config, "FILED", df)
+    return load_relationships_batch(driver, config, "FILED", chunks)
 
 def load_has_claim_relationships(driver, config):
     """Load HAS_CLAIM relationships (Beneficiary -> Claim)"""
-    filepath = os.path.join(PROCESSED_DATA_DIR, "has_claim_relationships.csv")
-    if not os.path.exists(filepath):
-        print(f"  File not found: {filepath}")
+    if loaded_with_claims(driver, config, "HAS_CLAIM"):
         return 0
     
-    df = pd.read_csv(filepath)
-    return load_relationships_batch(driver, config, "HAS_CLAIM", df)
-
-def load_attended_by_relationships(driver, config):
-    """Load ATTENDED_BY relationships (Claim -> Physician)"""
-    filepath = os.path.join(PROCESSED_DATA_DIR, "attended_by_relationships.csv")
-    if not os.path.exists(filepath):
-        print(f"  File not found: {filepath}")
+    chunks = iter_processed("has_claim_relationships", chunk_rows(config), RELATIONSHIP_COLUMNS["HAS_CLAIM"])
+    if chunks is None:
         return 0
     
-    df = pd.read_csv(filepath)
-    # Convert physician_type to string if needed
+    return load_relationships_batch(driver, config, "HAS_CLAIM", chunks)
+
+def prepare_attended_by_chunk(df):
+    """Convert physician_type to string if needed"""
     if 'physician_type' in df.columns:
         df['physician_type'] = df['physician_type'].astype(str)
     else:
         df['physician_type'] = 'Unknown'
+    return df
+
+def load_attended_by_relationships(driver, config):
+    """Load ATTENDED_BY relationships (Claim -> Physician)"""
+    chunks = iter_processed("attended_by_relationships", chunk_rows(config),
+                            RELATIONSHIP_COLUMNS["ATTENDED_BY"])
+    if chunks is None:
+        return 0
     
-    return load_relationships_batch(driver, config, "ATTENDED_BY", df)
+    return load_relationships_batch(driver, config, "ATTENDED_BY", chunks,
+                                    prepare_chunk=prepare_attended_by_chunk)
 
 def load_includes_code_relationships(driver, config):
     """Load INCLUDES_CODE relationships (Claim -> MedicalCode)"""
-    filepath = os.path.join(PROCESSED_DATA_DIR, "includes_code_relationships.csv")
-    if not os.path.exists(filepath):
-        print(f"  File not found: {filepath}")
+    chunks = iter_processed("includes_code_relationships", chunk_rows(config),
+                            RELATIONSHIP_COLUMNS["INCLUDES_CODE"])
+    if chunks is None:
         return 0
     
-    df = pd.read_csv(filepath)
-    return load_relationships_batch(driver, config, "INCLUDES_CODE", df)
+    return load_relationships_batch(driver, config, "INCLUDES_CODE", chunks)
 
 def verify_relationship_counts(driver, config):
     """Verify relationship counts in database"""
@@ -132,35 +241,31 @@ def verify_relationship_counts(driver, config):
     
     rel_types = ["FILED", "HAS_CLAIM", "ATTENDED_BY", "INCLUDES_CODE"]
     
+    # One round trip for all types (each branch is still answered from the count store)
+    cypher = " UNION ALL ".join(
+        f"MATCH ()-[r:{rel_type}]->() RETURN '{rel_type}' AS type, count(r) AS count" for rel_type in rel_types
+    )
+    
     with driver.session(database=config['database']) as session:
-        for rel_type in rel_types:
-            cypher = f"MATCH ()-[r:{rel_type}]->() RETURN count(r) AS count"
-            result = session.run(cypher)
-            count = result.single()['count']
-            print(f"  {rel_type}: {count} relationships")
+        for record in session.run(cypher):
+            print(f"  {record['type']}: {record['count']} relationships")
 
 def check_orphan_claims(driver, config):
     """Check for orphan claims (not connected to both provider and beneficiary)"""
     print("\nChecking for orphan claims...")
     
+    # Claims without provider and without beneficiary, counted in one pass over the claims
+    cypher = """
+    MATCH (c:Claim)
+    RETURN
+        sum(CASE WHEN count { (c)<-[:FILED]-() } = 0 THEN 1 ELSE 0 END) AS no_provider,
+        sum(CASE WHEN count { (c)<-[:HAS_CLAIM]-() } = 0 THEN 1 ELSE 0 END) AS no_beneficiary
+    """
+    
     with driver.session(database=config['database']) as session:
-        # Claims without provider
-        cypher = """
-        MATCH (c:Claim)
-        WHERE NOT (c)<-[:FILED]-()
-        RETURN count(c) AS count
-        """
-        result = session.run(cypher)
-        no_provider = result.single()['count']
-        
-        # Claims without beneficiary
-        cypher = """
-        MATCH (c:Claim)
-        WHERE NOT (c)<-[:HAS_CLAIM]-()
-        RETURN count(c) AS count
-        """
-        result = session.run(cypher)
-        no_beneficiary = result.single()['count']
+        record = session.run(cypher).single()
+        no_provider = record['no_provider']
+        no_beneficiary = record['no_beneficiary']
         
         print(f"  Claims without provider: {no_provider}")
         print(f"  Claims without beneficiary: {no_beneficiary}")
@@ -170,8 +275,8 @@ def check_orphan_claims(driver, config):
         else:
             print("  ⚠ Some orphan claims found")
 
-def main():
-    """Main execution function"""
+def main(context=None):
+    """Main execution function (context is passed through by the in-process pipeline runner)"""
     print("=" * 80)
     print("RELATIONSHIP LOADING PIPELINE")
     print("=" * 80)
@@ -179,14 +284,11 @@ def main():
     try:
         # Connect to Neo4j
         config = get_neo4j_config()
-        driver = GraphDatabase.driver(
-            config["uri"],
-            auth=(config["user"], config["password"]),
-            connection_timeout=config["connection_timeout"]
-        )
-        driver.verify_connectivity()
+        driver = get_driver(config)
         print(f"✓ Connected to Neo4j at {config['uri']}\n")
         
+        ensure_indexes(driver, config, LOOKUP_INDEXES, "lookup")
+        
         # Load relationships in order
         counts = {}
         counts['FILED'] = load_filed_relationships(driver, config)
@@ -210,13 +312,13 @@ def main():
             print(f"  {rel_type}: {count}")
         print("=" * 80)
         
-        driver.close()
-        
     except Exception as e:
         print(f"\n✗ Relationship loading failed: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    
+    return context
 
 if __name__ == "__main__":
     main()
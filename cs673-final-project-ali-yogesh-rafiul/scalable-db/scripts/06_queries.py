@@ -4,174 +4,428 @@ Executes all 12 required fraud detection queries
 """
 import sys
 import os
+import csv
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
-from neo4j import GraphDatabase
+from neo4j import READ_ACCESS
+from neo4j.exceptions import ClientError
+
+try:
+    import pyarrow  # noqa: F401 - needed by DataFrame.to_parquet
+except ImportError:
+    pyarrow = None
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.neo4j_config import get_neo4j_config
-
-OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "outputs", "results")
-QUERIES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "queries")
+from scripts._driver import get_driver
+from scripts._indexes import ensure_indexes
+from scripts._paths import RESULTS_DIR as OUTPUT_DIR, QUERIES_DIR
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(QUERIES_DIR, exist_ok=True)
 
-def execute_query(driver, config, query_name, cypher, description):
-    """Execute a Cypher query and return results as DataFrame"""
-    print(f"\n{'='*80}")
-    print(f"Query: {query_name}")
-    print(f"{'='*80}")
-    print(f"Description: {description}")
-    print(f"\nCypher Query:")
-    print(cypher)
-    print(f"\nExecuting query...")
+# Properties the queries filter or sort on (label, property); the ID lookups are
+# covered by the setup step's uniqueness constraints
+QUERY_INDEXES = [
+    ("Provider", "isFraud"),
+    ("Beneficiary", "isDeceased"),
+    ("Beneficiary", "age"),
+    ("Beneficiary", "State"),
+    ("Claim", "totalCost")
+]
+
+# Queries 8 and 10 run as one statement but are still reported and saved separately
+QUERY_8_NAME = "Query 8: Total Fraud Exposure"
+QUERY_10_NAME = "Query 10: Outpatient vs Inpatient Fraud Split"
+FRAUD_TOTALS_COLUMNS = ['claim_type', 'claim_count', 'total_cost', 'avg_cost', 'costed_claims',
+                        'max_claim_cost', 'min_claim_cost', 'provider_ids']
+
+# Thresholds and flags used by the queries, sent as parameters so each statement
+# text stays the same and its plan is cached (labels and types can't be parameters)
+PARAMS = {
+    "fraudFlag": 1,
+    "legitFlag": 0,
+    "deceasedFlag": 1,
+    "fraudProviderMin": 3,
+    "codeUsageMin": 50,
+    "costMin": 10000,
+    "fraudClaimMin": 10,
+    "claimRepeatMin": 3,
+    "ageMin": 85,
+    "unknownState": "UNKNOWN",
+    "topStates": 5,
+    "topN": 100
+}
+
+# Query option asking for the parallel runtime
+PARALLEL_RUNTIME = "CYPHER runtime=parallel"
+
+# Queries run concurrently, so each one's output is printed as a block under this lock
+print_lock = threading.Lock()
+
+# One read session per worker thread, reused for every query that thread runs
+_sessions = threading.local()
+_open_sessions = []
+_sessions_lock = threading.Lock()
+
+def fetch_fraud_ids(driver, config):
+    """Collect the fraud provider IDs once, passed to the queries as $fraudIds"""
+    with driver.session(database=config['database'], default_access_mode=READ_ACCESS) as session:
+        record = session.run("MATCH (p:Provider) WHERE p.isFraud = $fraudFlag RETURN collect(p.id) AS ids",
+                             fraudFlag=PARAMS['fraudFlag']).single()
+    print(f"  ✓ {len(record['ids'])} fraud providers")
+    return record['ids']
+
+def tag_fraud_claims(driver, config, fraud_ids):
+    """
+    Label the fraud providers' claims :FraudClaim, so queries can start from that subgraph
+    The tags are brought up to date on every run (stale ones removed, new ones added), in
+    server-side batches; once they are current this is a read-only pass.
+    """
+    with driver.session(database=config['database']) as session:
+        removed = session.run("""
+            MATCH (c:FraudClaim)
+            WHERE NOT EXISTS { (c)<-[:FILED]-(p:Provider) WHERE p.id IN $fraudIds }
+            CALL { WITH c REMOVE c:FraudClaim } IN TRANSACTIONS OF 10000 ROWS
+            """, fraudIds=fraud_ids).consume().counters.labels_removed
+        added = session.run("""
+            MATCH (p:Provider)
+            WHERE p.id IN $fraudIds
+            MATCH (p)-[:FILED]->(c:Claim)
+            WHERE NOT c:FraudClaim
+            CALL { WITH c SET c:FraudClaim } IN TRANSACTIONS OF 10000 ROWS
+            """, fraudIds=fraud_ids).consume().counters.labels_added
+    print(f"  ✓ Fraud claims tagged ({added} added, {removed} removed)")
+
+def fetch_states(driver, config):
+    """Collect the known beneficiary states once (read from the State index), passed to Query 9 as $states"""
+    with driver.session(database=config['database'], default_access_mode=READ_ACCESS) as session:
+        record = session.run("""
+            MATCH (b:Beneficiary)
+            WHERE b.State IS NOT NULL AND b.State <> $unknownState
+            RETURN collect(DISTINCT b.State) AS states
+            """, unknownState=PARAMS['unknownState']).single()
+    print(f"  ✓ {len(record['states'])} beneficiary states")
+    return record['states']
+
+def query_session(driver, config):
+    """Return this thread's read session, opening it on first use"""
+    session = getattr(_sessions, 'session', None)
+    if session is None:
+        session = driver.session(database=config['database'], default_access_mode=READ_ACCESS,
+                                 fetch_size=config['fetch_size'])
+        _sessions.session = session
+        with _sessions_lock:
+            _open_sessions.append(session)
+    return session
+
+def close_query_sessions():
+    """Close the sessions opened by the worker threads"""
+    with _sessions_lock:
+        for session in _open_sessions:
+            session.close()
+        _open_sessions.clear()
+
+def run_read(session, cypher, params, parallel, log):
+    """
+    Run a read query, on the parallel runtime if asked
+    The parallel runtime (Neo4j 5.13+ Enterprise) spreads scans and aggregations
+    over the server's cores; servers without it reject the query, which then
+    runs on the default runtime.
+    """
+    if parallel:
+        try:
+            result = session.run(PARALLEL_RUNTIME + cypher, params)
+            # Fetch the first record here, so a rejected runtime is caught before streaming
+            result.peek()
+            return result
+        except ClientError as e:
+            log(f"  ⚠ Parallel runtime not available, using the default runtime ({e.code})")
+    return session.run(cypher, params)
+
+def results_path(query_name, results_format='csv'):
+    """Results file for a query (.csv, or .parquet for the Parquet format)"""
+    return OUTPUT_DIR / f"{query_name.lower().replace(' ', '_')}.{results_format}"
+
+def results_format(config):
+    """The configured results format, falling back to CSV if Parquet can't be written"""
+    if config['results_format'] == 'parquet' and pyarrow is not None:
+        return 'parquet'
+    return 'csv'
+
+def native_temporals(frame):
+    """
+    Convert any neo4j.time values left in object columns (e.g. a column mixing dates and
+    strings, or times) to their Python equivalents, which Arrow can store
+    """
+    for col in frame.select_dtypes('object').columns:
+        if frame[col].map(lambda value: hasattr(value, 'to_native')).any():
+            frame[col] = frame[col].map(lambda value: value.to_native() if hasattr(value, 'to_native') else value)
+    return frame
+
+def write_frame(frame, output_path):
+    """Write a result DataFrame in the format given by the file suffix"""
+    if output_path.suffix == '.parquet':
+        native_temporals(frame).to_parquet(output_path, compression='zstd', index=False)
+    else:
+        frame.to_csv(output_path, index=False)
+
+def stream_to_csv(result, output_path, preview_rows=10):
+    """
+    Write records to CSV as they are fetched, keeping only the first few for the preview
+    Returns (rows written, columns, preview rows as value lists); no file is written for an empty result.
+    """
+    preview = []
+    columns = []
+    rows = 0
+    f = None
+    try:
+        for record in result:
+            if f is None:
+                f = open(output_path, 'w', newline='')
+                writer = csv.writer(f)
+                columns = record.keys()
+                writer.writerow(columns)
+            values = record.values()
+            writer.writerow(values)
+            if rows < preview_rows:
+                preview.append(values)
+            rows += 1
+    finally:
+        if f is not None:
+            f.close()
+    return rows, columns, preview
+
+def log_results(log, rows, columns, output_path, preview=None):
+    """Log the row count and columns (or, given preview rows, a formatted preview) and where the results were saved"""
+    log(f"  Results: {rows} rows")
+    if preview is None:
+        log(f"  Columns: {', '.join(columns)}")
+    else:
+        log(f"\nFirst 10 results:")
+        log(pd.DataFrame(preview, columns=columns).to_string())
+    log(f"\n  Results saved to: {output_path}")
+
+def execute_query(driver, config, query_name, cypher, description, params=None, parallel=False, split=None):
+    """
+    Execute a Cypher query, stream its results to CSV and return the number of rows (None if it failed)
+    The query gets PARAMS plus its own params; parallel=True asks for the parallel runtime.
+    split turns one (small) result DataFrame into several named results, each previewed
+    and saved on its own; a dict of their row counts is returned instead.
+    """
+    params = {**PARAMS, **(params or {})}
+    verbose = config['verbose_results']
+    # Buffer the output and print it in one piece, so concurrent queries don't interleave
+    lines = []
+    log = lines.append
+    log(f"\n{'='*80}")
+    log(f"Query: {query_name}")
+    log(f"{'='*80}")
+    log(f"Description: {description}")
+    if verbose:
+        log(f"\nCypher Query:")
+        log(cypher)
+    log(f"\nExecuting query...")
     
     try:
-        with driver.session(database=config['database']) as session:
-            result = session.run(cypher)
-            
-            # Convert to list of records
-            records = []
-            for record in result:
-                records.append(dict(record))
-            
-            if records:
-                df = pd.DataFrame(records)
-                print(f"✓ Query executed successfully")
-                print(f"  Results: {len(df)} rows")
-                print(f"\nFirst 10 results:")
-                print(df.head(10).to_string())
-                
-                # Save to CSV
-                output_path = os.path.join(OUTPUT_DIR, f"{query_name.lower().replace(' ', '_')}.csv")
-                df.to_csv(output_path, index=False)
-                print(f"\n  Results saved to: {output_path}")
-                
-                return df
+        result = run_read(query_session(driver, config), cypher, params, parallel, log)
+        
+        if split is not None:
+            # The driver builds the frame column by column, without a dict per record
+            # (and turns all-date columns into datetimes, which Parquet can store)
+            frames = split(result.to_df(parse_dates=True))
+            log(f"✓ Query executed successfully")
+            rows = {}
+            for name, frame in frames.items():
+                output_path = results_path(name, results_format(config))
+                write_frame(frame, output_path)
+                log(f"\n{name}")
+                log_results(log, len(frame), list(frame.columns), output_path,
+                            frame.head(10) if verbose else None)
+                rows[name] = len(frame)
+        elif results_format(config) == 'parquet':
+            # Results are capped by their LIMIT, so the frame is built in one piece
+            # (neo4j dates and datetimes become pandas datetimes for Arrow)
+            frame = result.to_df(parse_dates=True)
+            rows = len(frame)
+            if rows:
+                output_path = results_path(query_name, 'parquet')
+                write_frame(frame, output_path)
+                log(f"✓ Query executed successfully")
+                log_results(log, rows, list(frame.columns), output_path,
+                            frame.head(10) if verbose else None)
+            else:
+                log("  No results returned")
+        else:
+            # Rows go straight from the cursor to the file, without a full in-memory copy
+            output_path = results_path(query_name)
+            rows, columns, preview = stream_to_csv(result, output_path, preview_rows=10 if verbose else 0)
+            if rows:
+                log(f"✓ Query executed successfully")
+                log_results(log, rows, columns, output_path, preview if verbose else None)
             else:
-                print("  No results returned")
-                return pd.DataFrame()
-                
+                log("  No results returned")
+        
     except Exception as e:
-        print(f"✗ Query failed: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
-
-def query_1_spider_web(driver, config):
-    """Query 1: Spider Web Pattern - Beneficiaries connected to 3+ fraud providers"""
-    cypher = """
-    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE p.isFraud = 1
-    WITH b, collect(DISTINCT p) as fraudProviders
-    WHERE size(fraudProviders) >= 3
+        log(f"✗ Query failed: {e}")
+        log(traceback.format_exc().rstrip())
+        rows = None
+    
+    with print_lock:
+        print("\n".join(lines))
+    return rows
+
+def split_fraud_totals(by_type):
+    """Derive Query 8's totals and Query 10's split from the per-claim-type fraud aggregates"""
+    if by_type.empty:
+        by_type = pd.DataFrame(columns=FRAUD_TOTALS_COLUMNS)
+    
+    costed = by_type['costed_claims'].sum()
+    totals = pd.DataFrame([{
+        'total_fraud_exposure': by_type['total_cost'].sum(),
+        'fraud_provider_count': len(set().union(*by_type['provider_ids'])),
+        'total_fraud_claims': by_type['claim_count'].sum(),
+        'avg_claim_cost': by_type['total_cost'].sum() / costed if costed else None,
+        'max_claim_cost': by_type['max_claim_cost'].max(),
+        'min_claim_cost': by_type['min_claim_cost'].min()
+    }])
+    return {
+        QUERY_8_NAME: totals,
+        QUERY_10_NAME: by_type[['claim_type', 'claim_count', 'total_cost', 'avg_cost']]
+    }
+
+# Every query in report order, the single source for running and for saving them
+# (each worker thread has its own session, so they can run concurrently); parallel asks
+# for the parallel runtime, and a split query reports its results under several keys
+QUERIES = {
+    'query_1': {
+        'name': "Query 1: Spider Web Pattern",
+        'description': "Find beneficiaries connected to 3+ fraud providers - Identify victims of fraud rings",
+        'cypher': """
+    MATCH (p:Provider)
+    WHERE p.id IN $fraudIds
+    WITH p
+    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p)
+    WITH DISTINCT b, p
+    WITH b, count(p) as fraudProviderCount
+    WHERE fraudProviderCount >= $fraudProviderMin
+    WITH b, fraudProviderCount
+    ORDER BY fraudProviderCount DESC
+    LIMIT $topN
+    MATCH (b)-[:HAS_CLAIM]->(:FraudClaim)<-[:FILED]-(p:Provider)
+    WITH DISTINCT b, fraudProviderCount, p
+    WITH b, fraudProviderCount, collect(p.id) as fraudProviderIds
     RETURN b.id as beneficiary_id, 
            b.age as age,
-           b.state as state,
-           size(fraudProviders) as fraud_provider_count,
-           [provider in fraudProviders | provider.id] as fraud_provider_ids
+           b.State as state,
+           fraudProviderCount as fraud_provider_count,
+           fraudProviderIds as fraud_provider_ids
     ORDER BY fraud_provider_count DESC
-    LIMIT 100
     """
-    return execute_query(
-        driver, config, 
-        "Query 1: Spider Web Pattern",
-        cypher,
-        "Find beneficiaries connected to 3+ fraud providers - Identify victims of fraud rings"
-    )
-
-def query_2_shared_doctor_ring(driver, config):
-    """Query 2: Shared Doctor Ring - Fraud providers sharing same physicians"""
-    cypher = """
-    MATCH (p1:Provider)-[:FILED]->(c1:Claim)-[:ATTENDED_BY]->(phys:Physician)<-[:ATTENDED_BY]-(c2:Claim)<-[:FILED]-(p2:Provider)
-    WHERE p1.isFraud = 1 AND p2.isFraud = 1 AND p1.id <> p2.id
-    WITH p1, p2, collect(DISTINCT phys) as sharedPhysicians
-    WHERE size(sharedPhysicians) > 0
+    },
+    # Pairs are built from each physician's own fraud providers, once per pair (p1.id < p2.id),
+    # rather than by matching the whole claim-physician-claim path from both ends
+    'query_2': {
+        'name': "Query 2: Shared Doctor Ring",
+        'description': "Find fraud providers sharing same physicians - Detect physician collusion",
+        'cypher': """
+    MATCH (phys:Physician)<-[:ATTENDED_BY]-(:Claim)<-[:FILED]-(p:Provider)
+    WHERE p.id IN $fraudIds
+    WITH DISTINCT phys, p
+    WITH phys, collect(p) as fraudProviders
+    WHERE size(fraudProviders) >= 2
+    UNWIND fraudProviders as p1
+    UNWIND fraudProviders as p2
+    WITH p1, p2, phys
+    WHERE p1.id < p2.id
+    WITH p1, p2, collect(phys) as sharedPhysicians
     RETURN p1.id as provider1_id,
            p2.id as provider2_id,
            size(sharedPhysicians) as shared_physician_count,
            [phys in sharedPhysicians | phys.id] as shared_physician_ids
     ORDER BY shared_physician_count DESC
-    LIMIT 100
+    LIMIT $topN
     """
-    return execute_query(
-        driver, config,
-        "Query 2: Shared Doctor Ring",
-        cypher,
-        "Find fraud providers sharing same physicians - Detect physician collusion"
-    )
-
-def query_3_accomplice_physician(driver, config):
-    """Query 3: Accomplice Physician - Physicians connected to both fraud and legitimate providers"""
-    cypher = """
+    },
+    'query_3': {
+        'name': "Query 3: Accomplice Physician",
+        'description': "Find physicians connected to both fraud and legitimate providers - Identify suspicious physicians",
+        'cypher': """
     MATCH (phys:Physician)<-[:ATTENDED_BY]-(c:Claim)<-[:FILED]-(p:Provider)
+    WITH DISTINCT phys, p
     WITH phys, 
-         collect(DISTINCT CASE WHEN p.isFraud = 1 THEN p.id END) as fraudProviders,
-         collect(DISTINCT CASE WHEN p.isFraud = 0 THEN p.id END) as legitProviders
-    WHERE size([x in fraudProviders WHERE x IS NOT NULL]) > 0 
-      AND size([x in legitProviders WHERE x IS NOT NULL]) > 0
+         sum(CASE WHEN p.isFraud = $fraudFlag THEN 1 ELSE 0 END) as fraudCount,
+         sum(CASE WHEN p.isFraud = $legitFlag THEN 1 ELSE 0 END) as legitCount
+    WHERE fraudCount > 0 AND legitCount > 0
+    WITH phys, fraudCount, legitCount
+    ORDER BY fraudCount DESC, legitCount DESC
+    LIMIT $topN
+    MATCH (phys)<-[:ATTENDED_BY]-(:Claim)<-[:FILED]-(p:Provider)
+    WITH DISTINCT phys, fraudCount, legitCount, p
+    WITH phys, fraudCount, legitCount,
+         collect(CASE WHEN p.isFraud = $fraudFlag THEN p.id END) as fraudProviders,
+         collect(CASE WHEN p.isFraud = $legitFlag THEN p.id END) as legitProviders
     RETURN phys.id as physician_id,
-           size([x in fraudProviders WHERE x IS NOT NULL]) as fraud_provider_count,
-           size([x in legitProviders WHERE x IS NOT NULL]) as legit_provider_count,
-           [x in fraudProviders WHERE x IS NOT NULL] as fraud_provider_ids,
-           [x in legitProviders WHERE x IS NOT NULL] as legit_provider_ids
+           fraudCount as fraud_provider_count,
+           legitCount as legit_provider_count,
+           fraudProviders as fraud_provider_ids,
+           legitProviders as legit_provider_ids
     ORDER BY fraud_provider_count DESC, legit_provider_count DESC
-    LIMIT 100
     """
-    return execute_query(
-        driver, config,
-        "Query 3: Accomplice Physician",
-        cypher,
-        "Find physicians connected to both fraud and legitimate providers - Identify suspicious physicians"
-    )
-
-def query_4_diagnosis_clusters(driver, config):
-    """Query 4: Diagnosis Copy-Paste Clusters - Medical codes used >50 times by fraud providers"""
-    cypher = """
-    MATCH (m:MedicalCode)<-[:INCLUDES_CODE]-(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE p.isFraud = 1
+    },
+    'query_4': {
+        'name': "Query 4: Diagnosis Copy-Paste Clusters",
+        'description': "Find medical codes used >50 times by fraud providers - Detect diagnosis code abuse",
+        'parallel': True,
+        'cypher': """
+    MATCH (c:FraudClaim)
+    WITH c
+    MATCH (c)-[:INCLUDES_CODE]->(m:MedicalCode)
     WITH m, count(DISTINCT c) as usageCount
-    WHERE usageCount > 50
+    WHERE usageCount > $codeUsageMin
     RETURN m.code as medical_code,
            m.type as code_type,
            usageCount as usage_count
     ORDER BY usageCount DESC
-    LIMIT 100
+    LIMIT $topN
     """
-    return execute_query(
-        driver, config,
-        "Query 4: Diagnosis Copy-Paste Clusters",
-        cypher,
-        "Find medical codes used >50 times by fraud providers - Detect diagnosis code abuse"
-    )
-
-def query_5_high_value_fraud(driver, config):
-    """Query 5: High-Value Fraud Claims - Fraud provider claims with totalCost > 10000"""
-    cypher = """
-    MATCH (p:Provider)-[:FILED]->(c:Claim)-[:ATTENDED_BY]->(phys:Physician)
-    WHERE p.isFraud = 1 AND c.totalCost > 10000
+    },
+    'query_5': {
+        'name': "Query 5: High-Value Fraud Claims",
+        'description': "Find fraud provider claims with totalCost > 10000 - Identify expensive fraudulent claims",
+        'cypher': """
+    MATCH (c:Claim)
+    WHERE c.totalCost > $costMin
+    WITH c
+    ORDER BY c.totalCost DESC
+    MATCH (p:Provider)-[:FILED]->(c)
+    WHERE p.id IN $fraudIds AND EXISTS { (c)-[:ATTENDED_BY]->(:Physician) }
+    WITH p, c
+    ORDER BY c.totalCost DESC
+    LIMIT $topN
+    MATCH (c)-[:ATTENDED_BY]->(phys:Physician)
+    WITH DISTINCT p, c, phys
     RETURN p.id as provider_id,
            c.id as claim_id,
            c.type as claim_type,
            c.totalCost as total_cost,
-           collect(DISTINCT phys.id) as physician_ids
+           collect(phys.id) as physician_ids
     ORDER BY c.totalCost DESC
-    LIMIT 100
+    LIMIT $topN
     """
-    return execute_query(
-        driver, config,
-        "Query 5: High-Value Fraud Claims",
-        cypher,
-        "Find fraud provider claims with totalCost > 10000 - Identify expensive fraudulent claims"
-    )
-
-def query_6_dead_patient_claims(driver, config):
-    """Query 6: Dead Patient Claims - Claims filed for deceased beneficiaries"""
-    cypher = """
-    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE b.isDeceased = 1
+    },
+    'query_6': {
+        'name': "Query 6: Dead Patient Claims",
+        'description': "Find claims filed for deceased beneficiaries - Detect billing for dead patients",
+        'cypher': """
+    MATCH (b:Beneficiary)
+    WHERE b.isDeceased = $deceasedFlag
+    WITH b
+    MATCH (b)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p:Provider)
     RETURN b.id as beneficiary_id,
            b.age as age,
            c.id as claim_id,
@@ -180,291 +434,194 @@ def query_6_dead_patient_claims(driver, config):
            p.isFraud as provider_is_fraud,
            c.totalCost as total_cost
     ORDER BY c.totalCost DESC
-    LIMIT 100
+    LIMIT $topN
     """
-    return execute_query(
-        driver, config,
-        "Query 6: Dead Patient Claims",
-        cypher,
-        "Find claims filed for deceased beneficiaries - Detect billing for dead patients"
-    )
-
-def query_7_impossible_workload(driver, config):
-    """Query 7: Impossible Workload Physicians - Physicians with >10 fraud claims"""
-    cypher = """
-    MATCH (phys:Physician)<-[:ATTENDED_BY]-(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE p.isFraud = 1
+    },
+    'query_7': {
+        'name': "Query 7: Impossible Workload Physicians",
+        'description': "Find physicians with >10 fraud claims - Identify overworked or complicit physicians",
+        'parallel': True,
+        'cypher': """
+    MATCH (phys:Physician)<-[:ATTENDED_BY]-(c:FraudClaim)
     WITH phys, count(DISTINCT c) as fraudClaimCount
-    WHERE fraudClaimCount > 10
+    WHERE fraudClaimCount > $fraudClaimMin
     RETURN phys.id as physician_id,
            fraudClaimCount as fraud_claim_count
     ORDER BY fraudClaimCount DESC
-    LIMIT 100
+    LIMIT $topN
     """
-    return execute_query(
-        driver, config,
-        "Query 7: Impossible Workload Physicians",
-        cypher,
-        "Find physicians with >10 fraud claims - Identify overworked or complicit physicians"
-    )
-
-def query_8_total_fraud_exposure(driver, config):
-    """Query 8: Total Fraud Exposure - SUM(totalCost) for all fraud provider claims"""
-    cypher = """
+    },
+    # Queries 8 and 10 aggregate the same fraud provider claims, so they share one scan: the
+    # claims are grouped by type once and the overall totals are added up from the groups
+    'query_8': {
+        'name': "Query 8 + Query 10: Fraud Exposure and Claim Type Split",
+        'description': ("Calculate total fraudulent amount and COUNT(claims) by Claim.type for fraud providers - "
+                        "Fraud exposure and distribution by claim type"),
+        'parallel': True,
+        'split': split_fraud_totals,
+        'results': {'query_8': QUERY_8_NAME, 'query_10': QUERY_10_NAME},
+        'cypher': """
     MATCH (p:Provider)-[:FILED]->(c:Claim)
-    WHERE p.isFraud = 1
-    RETURN sum(c.totalCost) as total_fraud_exposure,
-           count(DISTINCT p) as fraud_provider_count,
-           count(c) as total_fraud_claims,
-           avg(c.totalCost) as avg_claim_cost,
+    WHERE p.id IN $fraudIds
+    RETURN c.type as claim_type,
+           count(c) as claim_count,
+           sum(c.totalCost) as total_cost,
+           avg(c.totalCost) as avg_cost,
+           count(c.totalCost) as costed_claims,
            max(c.totalCost) as max_claim_cost,
-           min(c.totalCost) as min_claim_cost
+           min(c.totalCost) as min_claim_cost,
+           collect(DISTINCT p.id) as provider_ids
+    ORDER BY claim_count DESC
     """
-    return execute_query(
-        driver, config,
-        "Query 8: Total Fraud Exposure",
-        cypher,
-        "Calculate total fraudulent amount - SUM(totalCost) for all fraud provider claims"
-    )
-
-def query_9_top_states_fraud(driver, config):
-    """Query 9: Top 5 States with Fraud Activity"""
-    cypher = """
-    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE p.isFraud = 1
-    WITH b.state as state, count(c) as claim_count
-    WHERE state IS NOT NULL AND state <> 'UNKNOWN'
+    },
+    'query_9': {
+        'name': "Query 9: Top 5 States with Fraud Activity",
+        'description': "COUNT(claims) by Beneficiary.State for fraud providers - Geographic fraud analysis",
+        'parallel': True,
+        'cypher': """
+    UNWIND $states as state
+    CALL {
+        WITH state
+        MATCH (b:Beneficiary {State: state})-[:HAS_CLAIM]->(c:FraudClaim)
+        RETURN count(c) as claim_count
+    }
+    WITH state, claim_count
+    WHERE claim_count > 0
     RETURN state,
            claim_count
     ORDER BY claim_count DESC
-    LIMIT 5
-    """
-    return execute_query(
-        driver, config,
-        "Query 9: Top 5 States with Fraud Activity",
-        cypher,
-        "COUNT(claims) by Beneficiary.state for fraud providers - Geographic fraud analysis"
-    )
-
-def query_10_claim_type_split(driver, config):
-    """Query 10: Outpatient vs Inpatient Fraud Split"""
-    cypher = """
-    MATCH (p:Provider)-[:FILED]->(c:Claim)
-    WHERE p.isFraud = 1
-    RETURN c.type as claim_type,
-           count(c) as claim_count,
-           sum(c.totalCost) as total_cost,
-           avg(c.totalCost) as avg_cost
-    ORDER BY claim_count DESC
+    LIMIT $topStates
     """
-    return execute_query(
-        driver, config,
-        "Query 10: Outpatient vs Inpatient Fraud Split",
-        cypher,
-        "COUNT(claims) by Claim.type for fraud providers - Fraud distribution by claim type"
-    )
-
-def query_11_repeat_offender(driver, config):
-    """Query 11: Repeat Offender Path - Beneficiaries with >3 claims from same fraud provider"""
-    cypher = """
-    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE p.isFraud = 1
+    },
+    'query_11': {
+        'name': "Query 11: Repeat Offender Path",
+        'description': "Find beneficiaries with >3 claims from same fraud provider - Identify repeat fraud patterns",
+        'cypher': """
+    MATCH (p:Provider)
+    WHERE p.id IN $fraudIds
+    WITH p
+    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p)
     WITH b, p, count(c) as claimCount
-    WHERE claimCount > 3
+    WHERE claimCount > $claimRepeatMin
     RETURN b.id as beneficiary_id,
            b.age as age,
-           b.state as state,
+           b.State as state,
            p.id as provider_id,
            claimCount as claim_count
     ORDER BY claimCount DESC
-    LIMIT 100
+    LIMIT $topN
     """
-    return execute_query(
-        driver, config,
-        "Query 11: Repeat Offender Path",
-        cypher,
-        "Find beneficiaries with >3 claims from same fraud provider - Identify repeat fraud patterns"
-    )
-
-def query_12_elder_fraud(driver, config):
-    """Query 12: Beneficiary Age Cluster - Fraud claims for beneficiaries age >85"""
-    cypher = """
-    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE p.isFraud = 1 AND b.age > 85
+    },
+    'query_12': {
+        'name': "Query 12: Beneficiary Age Cluster",
+        'description': "Find fraud claims for beneficiaries age >85 - Elder fraud detection",
+        'cypher': """
+    MATCH (b:Beneficiary)
+    WHERE b.age > $ageMin
+    WITH b
+    MATCH (b)-[:HAS_CLAIM]->(c:FraudClaim)
+    WITH b, count(c) as claimCount, sum(c.totalCost) as totalCost
+    ORDER BY totalCost DESC
+    LIMIT $topN
+    MATCH (b)-[:HAS_CLAIM]->(:FraudClaim)<-[:FILED]-(p:Provider)
+    WITH DISTINCT b, claimCount, totalCost, p
+    WITH b, claimCount, totalCost, collect(p.id) as fraudProviderIds
     RETURN b.id as beneficiary_id,
            b.age as age,
-           b.state as state,
-           count(c) as claim_count,
-           sum(c.totalCost) as total_cost,
-           collect(DISTINCT p.id) as fraud_provider_ids
+           b.State as state,
+           claimCount as claim_count,
+           totalCost as total_cost,
+           fraudProviderIds as fraud_provider_ids
     ORDER BY total_cost DESC
-    LIMIT 100
     """
-    return execute_query(
+    }
+}
+
+def query_params(query, lookups):
+    """The per-run parameters of a registered query (each lookup only goes to the queries using it)"""
+    return {name: value for name, value in lookups.items() if f"${name}" in query['cypher']}
+
+def warm_query_plans(driver, config, lookups):
+    """
+    Plan every query with EXPLAIN before the timed runs (nothing is executed)
+    The server caches each plan under the statement text, so the real runs skip planning.
+    """
+    print("Warming query plans...")
+    planned = 0
+    with driver.session(database=config['database'], default_access_mode=READ_ACCESS) as session:
+        for query in QUERIES.values():
+            params = {**PARAMS, **query_params(query, lookups)}
+            try:
+                if query.get('parallel'):
+                    try:
+                        session.run("EXPLAIN " + PARALLEL_RUNTIME + query['cypher'], params).consume()
+                        planned += 1
+                        continue
+                    except ClientError:
+                        # Runtime not available here; the run falls back to the default runtime
+                        pass
+                session.run("EXPLAIN " + query['cypher'], params).consume()
+                planned += 1
+            except Exception as e:
+                print(f"  ⚠ Could not plan {query['name']}: {e}")
+    print(f"  ✓ {planned} of {len(QUERIES)} query plans cached")
+
+def run_query(driver, config, key, lookups):
+    """Run a registered query, returning its row count (a split query returns its counts by key)"""
+    query = QUERIES[key]
+    params = query_params(query, lookups)
+    rows = execute_query(
         driver, config,
-        "Query 12: Beneficiary Age Cluster",
-        cypher,
-        "Find fraud claims for beneficiaries age >85 - Elder fraud detection"
+        query['name'],
+        query['cypher'],
+        query['description'],
+        params=params,
+        parallel=query.get('parallel', False),
+        split=query.get('split')
     )
+    if 'results' not in query:
+        return rows
+    return {result: None if rows is None else rows[name] for result, name in query['results'].items()}
+
+def run_queries(driver, config, lookups):
+    """Run all queries on a pool of worker threads, returning their results by name in report order"""
+    results = {f"query_{number}": None for number in range(1, 13)}
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, config['query_workers'])) as executor:
+            futures = {executor.submit(run_query, driver, config, key, lookups): key for key in QUERIES}
+            for future in as_completed(futures):
+                result = future.result()
+                # A shared statement returns the results of all its queries by name
+                if isinstance(result, dict):
+                    results.update(result)
+                else:
+                    results[futures[future]] = result
+    finally:
+        close_query_sessions()
+    return results
 
 def save_all_queries():
     """Save all Cypher queries to a file"""
-    queries = {
-        "Query 1: Spider Web Pattern": """
-    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE p.isFraud = 1
-    WITH b, collect(DISTINCT p) as fraudProviders
-    WHERE size(fraudProviders) >= 3
-    RETURN b.id as beneficiary_id, 
-           b.age as age,
-           b.state as state,
-           size(fraudProviders) as fraud_provider_count,
-           [provider in fraudProviders | provider.id] as fraud_provider_ids
-    ORDER BY fraud_provider_count DESC
-    LIMIT 100
-        """,
-        "Query 2: Shared Doctor Ring": """
-    MATCH (p1:Provider)-[:FILED]->(c1:Claim)-[:ATTENDED_BY]->(phys:Physician)<-[:ATTENDED_BY]-(c2:Claim)<-[:FILED]-(p2:Provider)
-    WHERE p1.isFraud = 1 AND p2.isFraud = 1 AND p1.id <> p2.id
-    WITH p1, p2, collect(DISTINCT phys) as sharedPhysicians
-    WHERE size(sharedPhysicians) > 0
-    RETURN p1.id as provider1_id,
-           p2.id as provider2_id,
-           size(sharedPhysicians) as shared_physician_count,
-           [phys in sharedPhysicians | phys.id] as shared_physician_ids
-    ORDER BY shared_physician_count DESC
-    LIMIT 100
-        """,
-        "Query 3: Accomplice Physician": """
-    MATCH (phys:Physician)<-[:ATTENDED_BY]-(c:Claim)<-[:FILED]-(p:Provider)
-    WITH phys, 
-         collect(DISTINCT CASE WHEN p.isFraud = 1 THEN p.id END) as fraudProviders,
-         collect(DISTINCT CASE WHEN p.isFraud = 0 THEN p.id END) as legitProviders
-    WHERE size([x in fraudProviders WHERE x IS NOT NULL]) > 0 
-      AND size([x in legitProviders WHERE x IS NOT NULL]) > 0
-    RETURN phys.id as physician_id,
-           size([x in fraudProviders WHERE x IS NOT NULL]) as fraud_provider_count,
-           size([x in legitProviders WHERE x IS NOT NULL]) as legit_provider_count,
-           [x in fraudProviders WHERE x IS NOT NULL] as fraud_provider_ids,
-           [x in legitProviders WHERE x IS NOT NULL] as legit_provider_ids
-    ORDER BY fraud_provider_count DESC, legit_provider_count DESC
-    LIMIT 100
-        """,
-        "Query 4: Diagnosis Copy-Paste Clusters": """
-    MATCH (m:MedicalCode)<-[:INCLUDES_CODE]-(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE p.isFraud = 1
-    WITH m, count(DISTINCT c) as usageCount
-    WHERE usageCount > 50
-    RETURN m.code as medical_code,
-           m.type as code_type,
-           usageCount as usage_count
-    ORDER BY usageCount DESC
-    LIMIT 100
-        """,
-        "Query 5: High-Value Fraud Claims": """
-    MATCH (p:Provider)-[:FILED]->(c:Claim)-[:ATTENDED_BY]->(phys:Physician)
-    WHERE p.isFraud = 1 AND c.totalCost > 10000
-    RETURN p.id as provider_id,
-           c.id as claim_id,
-           c.type as claim_type,
-           c.totalCost as total_cost,
-           collect(DISTINCT phys.id) as physician_ids
-    ORDER BY c.totalCost DESC
-    LIMIT 100
-        """,
-        "Query 6: Dead Patient Claims": """
-    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE b.isDeceased = 1
-    RETURN b.id as beneficiary_id,
-           b.age as age,
-           c.id as claim_id,
-           c.claimStartDate as claim_start_date,
-           p.id as provider_id,
-           p.isFraud as provider_is_fraud,
-           c.totalCost as total_cost
-    ORDER BY c.totalCost DESC
-    LIMIT 100
-        """,
-        "Query 7: Impossible Workload Physicians": """
-    MATCH (phys:Physician)<-[:ATTENDED_BY]-(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE p.isFraud = 1
-    WITH phys, count(DISTINCT c) as fraudClaimCount
-    WHERE fraudClaimCount > 10
-    RETURN phys.id as physician_id,
-           fraudClaimCount as fraud_claim_count
-    ORDER BY fraudClaimCount DESC
-    LIMIT 100
-        """,
-        "Query 8: Total Fraud Exposure": """
-    MATCH (p:Provider)-[:FILED]->(c:Claim)
-    WHERE p.isFraud = 1
-    RETURN sum(c.totalCost) as total_fraud_exposure,
-           count(DISTINCT p) as fraud_provider_count,
-           count(c) as total_fraud_claims,
-           avg(c.totalCost) as avg_claim_cost,
-           max(c.totalCost) as max_claim_cost,
-           min(c.totalCost) as min_claim_cost
-        """,
-        "Query 9: Top 5 States with Fraud Activity": """
-    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE p.isFraud = 1
-    WITH b.state as state, count(c) as claim_count
-    WHERE state IS NOT NULL AND state <> 'UNKNOWN'
-    RETURN state,
-           claim_count
-    ORDER BY claim_count DESC
-    LIMIT 5
-        """,
-        "Query 10: Outpatient vs Inpatient Fraud Split": """
-    MATCH (p:Provider)-[:FILED]->(c:Claim)
-    WHERE p.isFraud = 1
-    RETURN c.type as claim_type,
-           count(c) as claim_count,
-           sum(c.totalCost) as total_cost,
-           avg(c.totalCost) as avg_cost
-    ORDER BY claim_count DESC
-        """,
-        "Query 11: Repeat Offender Path": """
-    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE p.isFraud = 1
-    WITH b, p, count(c) as claimCount
-    WHERE claimCount > 3
-    RETURN b.id as beneficiary_id,
-           b.age as age,
-           b.state as state,
-           p.id as provider_id,
-           claimCount as claim_count
-    ORDER BY claimCount DESC
-    LIMIT 100
-        """,
-        "Query 12: Beneficiary Age Cluster": """
-    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE p.isFraud = 1 AND b.age > 85
-    RETURN b.id as beneficiary_id,
-           b.age as age,
-           b.state as state,
-           count(c) as claim_count,
-           sum(c.totalCost) as total_cost,
-           collect(DISTINCT p.id) as fraud_provider_ids
-    ORDER BY total_cost DESC
-    LIMIT 100
-        """
-    }
-    
-    output_path = os.path.join(QUERIES_DIR, "fraud_patterns.cypher")
+    output_path = QUERIES_DIR / "fraud_patterns.cypher"
     with open(output_path, 'w') as f:
         f.write("-- Healthcare Fraud Detection Queries\n")
-        f.write("-- CS 673 Scalable Databases - Fall 2025\n\n")
+        f.write("-- CS 673 Scalable Databases - Fall 2025\n")
+        f.write(f"-- :params {{{', '.join(f'{name}: {value!r}' for name, value in PARAMS.items())}}}\n")
+        f.write("-- $fraudIds: MATCH (p:Provider) WHERE p.isFraud = $fraudFlag RETURN collect(p.id)\n")
+        f.write("-- :FraudClaim: MATCH (p:Provider)-[:FILED]->(c:Claim) WHERE p.id IN $fraudIds SET c:FraudClaim\n")
+        f.write("-- $states: MATCH (b:Beneficiary) WHERE b.State <> $unknownState RETURN collect(DISTINCT b.State)\n\n")
         
-        for query_name, query in queries.items():
-            f.write(f"-- {query_name}\n")
-            f.write(query)
+        for query in QUERIES.values():
+            f.write(f"-- {query['name']}\n")
+            if 'split' in query:
+                f.write("-- (one row per claim type; the overall totals are summed over the types)\n")
+            f.write(query['cypher'])
             f.write("\n\n")
     
     print(f"\nAll queries saved to: {output_path}")
 
-def main():
-    """Main execution function"""
+def main(context=None):
+    """Main execution function (context is passed through by the in-process pipeline runner)"""
     print("=" * 80)
     print("FRAUD DETECTION QUERIES")
     print("=" * 80)
@@ -472,28 +629,28 @@ def main():
     try:
         # Connect to Neo4j
         config = get_neo4j_config()
-        driver = GraphDatabase.driver(
-            config["uri"],
-            auth=(config["user"], config["password"]),
-            connection_timeout=config["connection_timeout"]
-        )
-        driver.verify_connectivity()
+        driver = get_driver(config)
         print(f"✓ Connected to Neo4j at {config['uri']}\n")
         
-        # Execute all queries
-        results = {}
-        results['query_1'] = query_1_spider_web(driver, config)
-        results['query_2'] = query_2_shared_doctor_ring(driver, config)
-        results['query_3'] = query_3_accomplice_physician(driver, config)
-        results['query_4'] = query_4_diagnosis_clusters(driver, config)
-        results['query_5'] = query_5_high_value_fraud(driver, config)
-        results['query_6'] = query_6_dead_patient_claims(driver, config)
-        results['query_7'] = query_7_impossible_workload(driver, config)
-        results['query_8'] = query_8_total_fraud_exposure(driver, config)
-        results['query_9'] = query_9_top_states_fraud(driver, config)
-        results['query_10'] = query_10_claim_type_split(driver, config)
-        results['query_11'] = query_11_repeat_offender(driver, config)
-        results['query_12'] = query_12_elder_fraud(driver, config)
+        if config['results_format'] != results_format(config):
+            print(f"⚠ Results format '{config['results_format']}' is not available (Parquet needs pyarrow), writing CSV\n")
+        
+        ensure_indexes(driver, config, QUERY_INDEXES, "query")
+        
+        # The fraud provider set (shared by most queries) and the state list are looked up once
+        lookups = {
+            'fraudIds': fetch_fraud_ids(driver, config),
+            'states': fetch_states(driver, config)
+        }
+        
+        # Queries that only need the fraud claims start from this label instead of the providers
+        tag_fraud_claims(driver, config, lookups['fraudIds'])
+        
+        # Plan the queries up front, so their timings don't include compilation
+        warm_query_plans(driver, config, lookups)
+        
+        # Execute all queries (independent reads, each on its own session)
+        results = run_queries(driver, config, lookups)
         
         # Save all queries to file
         save_all_queries()
@@ -514,13 +671,13 @@ def main():
             print(f"Failed queries: {', '.join(failed_queries)}")
         print("=" * 80)
         
-        driver.close()
-        
     except Exception as e:
         print(f"\n✗ Query execution failed: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    
+    return context
 
 if __name__ == "__main__":
     main()
@@ -4,69 +4,216 @@ Generates results for all 10 required aggregation operations
 """
 import sys
 import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from neo4j import GraphDatabase
+from neo4j.exceptions import ClientError
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Parquet results need pyarrow; CSV is written with pandas either way
+    pa = None
+    pq = None
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.neo4j_config import get_neo4j_config
-
-OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "outputs", "results")
+from scripts._driver import get_driver
+from scripts._paths import RESULTS_DIR as OUTPUT_DIR
+from scripts._cache import graph_version, load_cached, save_cached
+from scripts._indexes import ensure_indexes
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Properties the aggregations filter on (label, property), so e.g. the fraud providers are
+# found with an index seek instead of a scan of every Provider
+AGGREGATION_INDEXES = [
+    ("Provider", "isFraud"),
+    ("Beneficiary", "isDeceased")
+]
+
+# Aggregations run concurrently, so each one's output is printed as a block under this lock
+print_lock = threading.Lock()
+
+def aggregation_session(driver, config):
+    """
+    Session for fetching an aggregation's results, which are pulled in a single batch
+    (fetch_size=-1): every aggregation returns at most a LIMIT of rows or one record.
+    """
+    return driver.session(database=config['database'], fetch_size=-1)
+
+def fetch_columns(result):
+    """Read a result into one list per column (no dict per record); returns (columns, row count)"""
+    keys = result.keys()
+    columns = {key: [] for key in keys}
+    appends = [columns[key].append for key in keys]
+    rows = 0
+    for record in result:
+        for append, value in zip(appends, record.values()):
+            append(value)
+        rows += 1
+    return columns, rows
+
+def output_name(agg_name):
+    """Results file name (without extension): remove periods, replace spaces with underscores"""
+    clean_name = agg_name.lower().replace('.', '').replace(' ', '_').strip('_')
+    return f"aggregation_{clean_name}"
+
+def export_aggregation(driver, config, agg_name, cypher):
+    """
+    Have the server write an aggregation's results straight to CSV with apoc.export.csv.query
+    The file is written to the server's import directory under the name the results file would
+    have, so that directory must be the results directory (see docker-compose.yml).
+    Any local copy is removed first, so a file left by an earlier run is never taken for this one.
+    Returns the number of rows exported.
+    """
+    (OUTPUT_DIR / f"{output_name(agg_name)}.csv").unlink(missing_ok=True)
+    with driver.session(database=config['database']) as session:
+        record = session.run(
+            "CALL apoc.export.csv.query($query, $file, {quotes: 'ifNeeded'}) YIELD rows RETURN rows",
+            query=cypher, file=f"{output_name(agg_name)}.csv"
+        ).single()
+    return record['rows']
+
+def log_export(log, agg_name, rows):
+    """Report an aggregation the server exported, previewing the first rows of its file"""
+    output_path = OUTPUT_DIR / f"{output_name(agg_name)}.csv"
+    log(f"✓ Aggregation exported by the server")
+    log(f"  Results: {rows} rows")
+    if not rows:
+        return
+    if not output_path.exists():
+        log(f"⚠ {output_path.name} was not written to {OUTPUT_DIR} (is the server's import directory mounted there?)")
+        return
+    log(f"\nFirst 10 results:")
+    log(pd.read_csv(output_path, nrows=10).to_string())
+    log(f"\n  Results saved to: {output_path}")
+
+def save_aggregation(log, config, agg_name, columns, rows):
+    """Preview an aggregation's columns and save them to its results file"""
+    if rows:
+        log(f"✓ Aggregation executed successfully")
+        log(f"  Results: {rows} rows")
+        log(f"\nFirst 10 results:")
+        log(pd.DataFrame({key: values[:10] for key, values in columns.items()}).to_string())
+        
+        # Save to CSV (or Parquet with NEO4J_RESULTS_FORMAT=parquet)
+        if config['results_format'] == 'parquet' and pq is not None:
+            output_path = OUTPUT_DIR / f"{output_name(agg_name)}.parquet"
+            pq.write_table(pa.table(columns), output_path, compression='zstd')
+        else:
+            output_path = OUTPUT_DIR / f"{output_name(agg_name)}.csv"
+            pd.DataFrame(columns).to_csv(output_path, index=False)
+        log(f"\n  Results saved to: {output_path}")
+    else:
+        log("  No results returned")
+
 def execute_aggregation(driver, config, agg_name, cypher, description):
-    """Execute an aggregation query and return results"""
-    print(f"\n{'='*80}")
-    print(f"Aggregation: {agg_name}")
-    print(f"{'='*80}")
-    print(f"Description: {description}")
-    print(f"\nCypher Query:")
-    print(cypher)
-    print(f"\nExecuting...")
+    """Execute an aggregation query, save its results and return the number of rows (None if it failed)"""
+    # Buffer the output and print it in one piece, so concurrent aggregations don't interleave
+    lines = []
+    log = lines.append
+    log(f"\n{'='*80}")
+    log(f"Aggregation: {agg_name}")
+    log(f"{'='*80}")
+    log(f"Description: {description}")
+    log(f"\nCypher Query:")
+    log(cypher)
+    log(f"\nExecuting...")
     
     try:
-        with driver.session(database=config['database']) as session:
-            result = session.run(cypher)
-            
-            records = []
-            for record in result:
-                records.append(dict(record))
-            
-            if records:
-                df = pd.DataFrame(records)
-                print(f"✓ Aggregation executed successfully")
-                print(f"  Results: {len(df)} rows")
-                print(f"\nFirst 10 results:")
-                print(df.head(10).to_string())
-                
-                # Save to CSV
-                # Clean filename: remove periods, replace spaces with underscores
-                clean_name = agg_name.lower().replace('.', '').replace(' ', '_').strip('_')
-                output_path = os.path.join(OUTPUT_DIR, f"aggregation_{clean_name}.csv")
-                df.to_csv(output_path, index=False)
-                print(f"\n  Results saved to: {output_path}")
+        # Reuse the saved columns if the graph has not changed since they were fetched
+        version = config['graph_version']
+        columns = load_cached(cypher, version)
+        rows = None
+        if columns is not None:
+            rows = len(next(iter(columns.values()), []))
+            log(f"✓ Loaded from cache (transaction {version})")
+        elif config['use_apoc_export'] and config['results_format'] == 'csv':
+            try:
+                rows = export_aggregation(driver, config, agg_name, cypher)
+            except ClientError as e:
+                log(f"⚠ apoc.export.csv.query failed, fetching the results instead: {e.message}")
+        
+        if columns is None and rows is not None:
+            log_export(log, agg_name, rows)
+        else:
+            if columns is None:
+                with aggregation_session(driver, config) as session:
+                    columns, rows = fetch_columns(session.run(cypher))
+                save_cached(cypher, version, columns)
+            save_aggregation(log, config, agg_name, columns, rows)
                 
-                return df
-            else:
-                print("  No results returned")
-                return pd.DataFrame()
+    except Exception as e:
+        log(f"✗ Aggregation failed: {e}")
+        log(traceback.format_exc().rstrip())
+        rows = None
+    
+    with print_lock:
+        print("\n".join(lines))
+    return rows
+
+def execute_fused_aggregation(driver, config, cypher, parts):
+    """
+    Execute a query that computes several aggregations at once and save each one's results
+    The query returns a single record with one list of maps per aggregation; parts holds each
+    one's (result key, name, description, columns). Returns the row counts (None if it failed).
+    """
+    lines = []
+    log = lines.append
+    log(f"\n{'='*80}")
+    log(f"Aggregations: {', '.join(agg_name for _, agg_name, _, _ in parts)}")
+    log(f"{'='*80}")
+    log(f"\nCypher Query (one pass for all of them):")
+    log(cypher)
+    log(f"\nExecuting...")
+    
+    try:
+        version = config['graph_version']
+        results = load_cached(cypher, version)
+        if results is not None:
+            log(f"✓ Loaded from cache (transaction {version})")
+        else:
+            with aggregation_session(driver, config) as session:
+                results = session.run(cypher).single().data()
+            save_cached(cypher, version, results)
+        
+        counts = []
+        for key, agg_name, description, keys in parts:
+            log(f"\n{'-'*80}")
+            log(f"Aggregation: {agg_name}")
+            log(f"Description: {description}")
+            log(f"{'-'*80}")
+            columns = {col: [row[col] for row in results[key]] for col in keys}
+            save_aggregation(log, config, agg_name, columns, len(results[key]))
+            counts.append(len(results[key]))
                 
     except Exception as e:
-        print(f"✗ Aggregation failed: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+        log(f"✗ Aggregations failed: {e}")
+        log(traceback.format_exc().rstrip())
+        counts = [None] * len(parts)
+    
+    with print_lock:
+        print("\n".join(lines))
+    return counts
 
 def aggregation_1_providers_per_beneficiary(driver, config):
-    """Aggregation 1: COUNT(DISTINCT providers) per beneficiary"""
+    """
+    Aggregation 1: COUNT(DISTINCT providers) per beneficiary
+    Each beneficiary-provider pair is kept once and counted, so no list of providers is
+    collected per beneficiary just to take its size.
+    """
     cypher = """
-    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p:Provider)
-    WITH b, collect(DISTINCT p) as providers
-    RETURN b.id as beneficiary_id,
-           size(providers) as provider_count
+    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(:Claim)<-[:FILED]-(p:Provider)
+    WITH DISTINCT b, p
+    WITH b, count(p) as provider_count
     ORDER BY provider_count DESC
     LIMIT 100
+    RETURN b.id as beneficiary_id,
+           provider_count
     """
     return execute_aggregation(
         driver, config,
@@ -75,25 +222,6 @@ def aggregation_1_providers_per_beneficiary(driver, config):
         "COUNT(DISTINCT providers) per beneficiary - Victim analysis"
     )
 
-def aggregation_2_total_cost_per_provider(driver, config):
-    """Aggregation 2: SUM(totalCost) per provider"""
-    cypher = """
-    MATCH (p:Provider)-[:FILED]->(c:Claim)
-    RETURN p.id as provider_id,
-           p.isFraud as is_fraud,
-           sum(c.totalCost) as total_cost,
-           count(c) as claim_count,
-           avg(c.totalCost) as avg_claim_cost
-    ORDER BY total_cost DESC
-    LIMIT 100
-    """
-    return execute_aggregation(
-        driver, config,
-        "2. Total Cost per Provider",
-        cypher,
-        "SUM(totalCost) per provider - Fraud exposure calculation"
-    )
-
 def aggregation_3_claims_per_physician(driver, config):
     """Aggregation 3: COUNT(claims) per physician"""
     cypher = """
@@ -127,79 +255,130 @@ def aggregation_4_claims_per_medical_code(driver, config):
         "COUNT(claims) per medical code - Code usage frequency"
     )
 
-def aggregation_5_fraud_claims_per_state(driver, config):
-    """Aggregation 5: COUNT(fraud claims) per state"""
-    cypher = """
-    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE p.isFraud = 1 AND b.State IS NOT NULL AND b.State <> 'UNKNOWN'
-    RETURN b.State as state,
-           count(c) as fraud_claim_count,
-           count(DISTINCT b) as beneficiary_count,
-           count(DISTINCT p) as provider_count
-    ORDER BY fraud_claim_count DESC
-    LIMIT 20
+def aggregations_2_7_8_provider_costs(driver, config):
     """
-    return execute_aggregation(
-        driver, config,
-        "5. Fraud Claims per State",
-        cypher,
-        "COUNT(fraud claims) per state - Geographic distribution"
-    )
-
-def aggregation_6_avg_age_fraud_victims(driver, config):
-    """Aggregation 6: AVG(age) of fraud victims"""
-    cypher = """
-    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p:Provider)
-    WHERE p.isFraud = 1
-    RETURN avg(b.age) as avg_age,
-           min(b.age) as min_age,
-           max(b.age) as max_age,
-           count(DISTINCT b) as fraud_victim_count
+    Aggregations 2, 7 and 8: SUM(totalCost) per provider, COUNT(claims) by claim type and
+    MAX(totalCost) per provider for fraud providers
+    All three come from one scan of the FILED relationships: the claims are grouped per
+    provider and claim type once, and each aggregation re-groups those (few) rows.
     """
-    return execute_aggregation(
-        driver, config,
-        "6. Average Age of Fraud Victims",
-        cypher,
-        "AVG(age) of fraud victims - Demographic analysis"
-    )
-
-def aggregation_7_claims_by_claim_type(driver, config):
-    """Aggregation 7: COUNT(claims) by claim type"""
     cypher = """
     MATCH (p:Provider)-[:FILED]->(c:Claim)
-    WHERE p.isFraud = 1
-    RETURN c.type as claim_type,
-           count(c) as claim_count,
-           sum(c.totalCost) as total_cost,
-           avg(c.totalCost) as avg_cost
-    ORDER BY claim_count DESC
+    WITH p, c.type as claim_type,
+         count(c) as claim_count,
+         sum(c.totalCost) as total_cost,
+         count(c.totalCost) as costed_claims,
+         max(c.totalCost) as max_claim_cost,
+         min(c.totalCost) as min_claim_cost
+    WITH collect({provider_id: p.id, is_fraud: p.isFraud, claim_type: claim_type,
+                  claim_count: claim_count, total_cost: total_cost, costed_claims: costed_claims,
+                  max_claim_cost: max_claim_cost, min_claim_cost: min_claim_cost}) as groups
+    CALL {
+        WITH groups
+        UNWIND groups as g
+        WITH g.provider_id as provider_id,
+             g.is_fraud as is_fraud,
+             sum(g.total_cost) as total_cost,
+             sum(g.claim_count) as claim_count,
+             sum(g.costed_claims) as costed_claims
+        ORDER BY total_cost DESC
+        LIMIT 100
+        RETURN collect({provider_id: provider_id, is_fraud: is_fraud, total_cost: total_cost,
+                        claim_count: claim_count,
+                        avg_claim_cost: CASE WHEN costed_claims > 0 THEN toFloat(total_cost) / costed_claims END}) as cost_per_provider
+    }
+    CALL {
+        WITH groups
+        UNWIND groups as g
+        WITH g
+        WHERE g.is_fraud = 1
+        WITH g.claim_type as claim_type,
+             sum(g.claim_count) as claim_count,
+             sum(g.total_cost) as total_cost,
+             sum(g.costed_claims) as costed_claims
+        ORDER BY claim_count DESC
+        RETURN collect({claim_type: claim_type, claim_count: claim_count, total_cost: total_cost,
+                        avg_cost: CASE WHEN costed_claims > 0 THEN toFloat(total_cost) / costed_claims END}) as claims_by_type
+    }
+    CALL {
+        WITH groups
+        UNWIND groups as g
+        WITH g
+        WHERE g.is_fraud = 1
+        WITH g.provider_id as provider_id,
+             max(g.max_claim_cost) as max_claim_cost,
+             min(g.min_claim_cost) as min_claim_cost,
+             sum(g.total_cost) as total_cost,
+             sum(g.claim_count) as claim_count,
+             sum(g.costed_claims) as costed_claims
+        ORDER BY max_claim_cost DESC
+        LIMIT 100
+        RETURN collect({provider_id: provider_id, max_claim_cost: max_claim_cost, min_claim_cost: min_claim_cost,
+                        avg_claim_cost: CASE WHEN costed_claims > 0 THEN toFloat(total_cost) / costed_claims END,
+                        claim_count: claim_count}) as max_cost_per_provider
+    }
+    RETURN cost_per_provider, claims_by_type, max_cost_per_provider
     """
-    return execute_aggregation(
-        driver, config,
-        "7. Claims by Claim Type",
-        cypher,
-        "COUNT(claims) by claim type - Claim type distribution"
-    )
+    return execute_fused_aggregation(driver, config, cypher, [
+        ('cost_per_provider', "2. Total Cost per Provider",
+         "SUM(totalCost) per provider - Fraud exposure calculation",
+         ['provider_id', 'is_fraud', 'total_cost', 'claim_count', 'avg_claim_cost']),
+        ('claims_by_type', "7. Claims by Claim Type",
+         "COUNT(claims) by claim type - Claim type distribution",
+         ['claim_type', 'claim_count', 'total_cost', 'avg_cost']),
+        ('max_cost_per_provider', "8. Max Cost per Provider",
+         "MAX(totalCost) per provider - Highest fraud claim identification",
+         ['provider_id', 'max_claim_cost', 'min_claim_cost', 'avg_claim_cost', 'claim_count'])
+    ])
 
-def aggregation_8_max_cost_per_provider(driver, config):
-    """Aggregation 8: MAX(totalCost) per provider"""
+def aggregations_5_6_fraud_victims(driver, config):
+    """
+    Aggregations 5 and 6: COUNT(fraud claims) per state and AVG(age) of fraud victims
+    Both read the fraud providers' claims and their beneficiaries, so that subgraph is
+    matched once: claims are counted per beneficiary-provider pair, and each aggregation
+    is taken over those pairs (the average age is still weighted by claims).
+    """
     cypher = """
-    MATCH (p:Provider)-[:FILED]->(c:Claim)
+    MATCH (b:Beneficiary)-[:HAS_CLAIM]->(c:Claim)<-[:FILED]-(p:Provider)
     WHERE p.isFraud = 1
-    RETURN p.id as provider_id,
-           max(c.totalCost) as max_claim_cost,
-           min(c.totalCost) as min_claim_cost,
-           avg(c.totalCost) as avg_claim_cost,
-           count(c) as claim_count
-    ORDER BY max_claim_cost DESC
-    LIMIT 100
+    WITH b, p, count(c) as claim_count
+    WITH collect({beneficiary_id: b.id, provider_id: p.id, state: b.State, age: b.age,
+                  claim_count: claim_count}) as pairs
+    CALL {
+        WITH pairs
+        UNWIND pairs as g
+        WITH g
+        WHERE g.state IS NOT NULL AND g.state <> 'UNKNOWN'
+        WITH g.state as state,
+             sum(g.claim_count) as fraud_claim_count,
+             count(DISTINCT g.beneficiary_id) as beneficiary_count,
+             count(DISTINCT g.provider_id) as provider_count
+        ORDER BY fraud_claim_count DESC
+        LIMIT 20
+        RETURN collect({state: state, fraud_claim_count: fraud_claim_count,
+                        beneficiary_count: beneficiary_count, provider_count: provider_count}) as claims_per_state
+    }
+    CALL {
+        WITH pairs
+        UNWIND pairs as g
+        WITH sum(CASE WHEN g.age IS NOT NULL THEN toFloat(g.age) * g.claim_count ELSE 0 END) as age_total,
+             sum(CASE WHEN g.age IS NOT NULL THEN g.claim_count ELSE 0 END) as aged_claims,
+             min(g.age) as min_age,
+             max(g.age) as max_age,
+             count(DISTINCT g.beneficiary_id) as fraud_victim_count
+        RETURN [{avg_age: CASE WHEN aged_claims > 0 THEN age_total / aged_claims END,
+                 min_age: min_age, max_age: max_age, fraud_victim_count: fraud_victim_count}] as fraud_victim_ages
+    }
+    RETURN claims_per_state, fraud_victim_ages
     """
-    return execute_aggregation(
-        driver, config,
-        "8. Max Cost per Provider",
-        cypher,
-        "MAX(totalCost) per provider - Highest fraud claim identification"
-    )
+    return execute_fused_aggregation(driver, config, cypher, [
+        ('claims_per_state', "5. Fraud Claims per State",
+         "COUNT(fraud claims) per state - Geographic distribution",
+         ['state', 'fraud_claim_count', 'beneficiary_count', 'provider_count']),
+        ('fraud_victim_ages', "6. Average Age of Fraud Victims",
+         "AVG(age) of fraud victims - Demographic analysis",
+         ['avg_age', 'min_age', 'max_age', 'fraud_victim_count'])
+    ])
 
 def aggregation_9_deceased_beneficiaries_with_claims(driver, config):
     """Aggregation 9: COUNT(deceased beneficiaries) with claims"""
@@ -219,12 +398,22 @@ def aggregation_9_deceased_beneficiaries_with_claims(driver, config):
     )
 
 def aggregation_10_shared_physicians_fraud_providers(driver, config):
-    """Aggregation 10: COUNT(shared physicians) between fraud providers"""
+    """
+    Aggregation 10: COUNT(shared physicians) between fraud providers
+    Pairs are built from each physician's own fraud providers, once per pair (p1.id < p2.id),
+    rather than by matching the whole claim-physician-claim path from both ends.
+    """
     cypher = """
-    MATCH (p1:Provider)-[:FILED]->(c1:Claim)-[:ATTENDED_BY]->(phys:Physician)
-          <-[:ATTENDED_BY]-(c2:Claim)<-[:FILED]-(p2:Provider)
-    WHERE p1.isFraud = 1 AND p2.isFraud = 1 AND p1.id <> p2.id
-    WITH p1, p2, collect(DISTINCT phys) as sharedPhysicians
+    MATCH (phys:Physician)<-[:ATTENDED_BY]-(:Claim)<-[:FILED]-(p:Provider)
+    WHERE p.isFraud = 1
+    WITH DISTINCT phys, p
+    WITH phys, collect(p) as fraudProviders
+    WHERE size(fraudProviders) >= 2
+    UNWIND fraudProviders as p1
+    UNWIND fraudProviders as p2
+    WITH p1, p2, phys
+    WHERE p1.id < p2.id
+    WITH p1, p2, collect(phys) as sharedPhysicians
     RETURN p1.id as provider1_id,
            p2.id as provider2_id,
            size(sharedPhysicians) as shared_physician_count,
@@ -239,46 +428,55 @@ def aggregation_10_shared_physicians_fraud_providers(driver, config):
         "COUNT(shared physicians) between fraud providers - Collusion metric"
     )
 
-def main():
-    """Main execution function"""
+# Aggregations in report order (independent reads, each on its own session;
+# 2, 7 and 8 share one query, as do 5 and 6)
+AGGREGATION_FNS = [
+    aggregation_1_providers_per_beneficiary,
+    aggregations_2_7_8_provider_costs,
+    aggregation_3_claims_per_physician,
+    aggregation_4_claims_per_medical_code,
+    aggregations_5_6_fraud_victims,
+    aggregation_9_deceased_beneficiaries_with_claims,
+    aggregation_10_shared_physicians_fraud_providers
+]
+
+def run_aggregations(driver, config):
+    """Run all aggregations on a pool of worker threads, returning their results in report order"""
+    with ThreadPoolExecutor(max_workers=max(1, config['query_workers'])) as executor:
+        futures = [executor.submit(fn, driver, config) for fn in AGGREGATION_FNS]
+        return [future.result() for future in futures]
+
+def main(context=None):
+    """Main execution function (context is passed through by the in-process pipeline runner)"""
     try:
         config = get_neo4j_config()
-        driver = GraphDatabase.driver(
-            config["uri"],
-            auth=(config["user"], config["password"]),
-            connection_timeout=config["connection_timeout"]
-        )
-        driver.verify_connectivity()
+        driver = get_driver(config)
         print(f"✓ Connected to Neo4j at {config['uri']}\n")
         
+        ensure_indexes(driver, config, AGGREGATION_INDEXES, "aggregation")
+        
         print("=" * 80)
         print("AGGREGATION OPERATIONS - RESULTS GENERATION")
         print("=" * 80)
         
-        # Execute all aggregations
-        aggregation_1_providers_per_beneficiary(driver, config)
-        aggregation_2_total_cost_per_provider(driver, config)
-        aggregation_3_claims_per_physician(driver, config)
-        aggregation_4_claims_per_medical_code(driver, config)
-        aggregation_5_fraud_claims_per_state(driver, config)
-        aggregation_6_avg_age_fraud_victims(driver, config)
-        aggregation_7_claims_by_claim_type(driver, config)
-        aggregation_8_max_cost_per_provider(driver, config)
-        aggregation_9_deceased_beneficiaries_with_claims(driver, config)
-        aggregation_10_shared_physicians_fraud_providers(driver, config)
+        # Read the graph version once, so every aggregation checks the cache against the same one
+        config['graph_version'] = graph_version(driver, config)
+        
+        # Execute all aggregations (concurrently, NEO4J_QUERY_WORKERS at a time)
+        run_aggregations(driver, config)
         
         print("\n" + "=" * 80)
         print("ALL AGGREGATIONS COMPLETE")
         print("=" * 80)
         print(f"\nResults saved to: {OUTPUT_DIR}")
         
-        driver.close()
-        
     except Exception as e:
         print(f"\n✗ Aggregation generation failed: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    
+    return context
 
 if __name__ == "__main__":
     main()
@@ -4,38 +4,100 @@ Exports all query results to JSON format for additional documentation
 """
 import sys
 import os
+import csv
 import json
-import pandas as pd
-from neo4j import GraphDatabase
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    # Fall back to the standard library encoder if orjson is not installed
+    orjson = None
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.neo4j_config import get_neo4j_config
-
-OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "outputs", "results")
-JSON_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "outputs", "results", "json")
+from scripts._paths import RESULTS_DIR as OUTPUT_DIR, JSON_DIR
 os.makedirs(JSON_DIR, exist_ok=True)
 
+def encode(value):
+    """Encode a value as compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(value, default=str)
+    return json.dumps(value, default=str).encode('utf-8')
+
+def field_type(text):
+    """The narrowest type of a non-empty CSV field: int, float, or str (zero-padded codes like '0389' stay text)"""
+    digits = text.lstrip('+-')
+    if len(digits) > 1 and digits[0] == '0' and digits[1].isdigit():
+        return str
+    try:
+        int(text)
+        return int
+    except ValueError:
+        pass
+    try:
+        float(text)
+        return float
+    except ValueError:
+        return str
+
+def column_types(csv_file):
+    """
+    Infer one type per column, as pandas did: int, float, or str if any field is not a number
+    Reads the file once up front, so a column never mixes numbers and text in the output.
+    """
+    with open(csv_file, newline='') as src:
+        reader = csv.reader(src)
+        types = [int] * len(next(reader, []))
+        for row in reader:
+            for i, text in enumerate(row[:len(types)]):
+                if text == '' or types[i] is str:
+                    continue
+                kind = field_type(text)
+                if kind is str:
+                    types[i] = str
+                elif kind is float:
+                    types[i] = float
+    return types
+
+def parse_value(text, kind):
+    """A CSV field as JSON in its column's type, with empty fields as null"""
+    if text == '':
+        return None
+    if kind is str:
+        return text
+    if kind is int:
+        return int(text)
+    number = float(text)
+    return number if math.isfinite(number) else None
+
 def export_csv_to_json(csv_file, json_file):
-    """Convert CSV file to JSON format"""
+    """
+    Convert CSV file to JSON format
+    Rows are streamed from the CSV into the output's data array one at a time
+    (one object per line, after a first pass that infers the column types),
+    so the file is never held in memory as a whole.
+    """
     try:
-        df = pd.read_csv(csv_file)
-        # Convert to list of dictionaries
-        data = df.to_dict('records')
-        
-        # Create structured JSON
-        result = {
-            "query_name": os.path.basename(csv_file).replace('.csv', ''),
-            "row_count": len(data),
-            "columns": list(df.columns),
-            "data": data
-        }
+        row_count = 0
+        types = column_types(csv_file)
+        with open(csv_file, newline='') as src, open(json_file, 'wb') as out:
+            reader = csv.reader(src)
+            columns = next(reader, [])
+            
+            out.write(b'{\n  "query_name": ' + encode(os.path.basename(csv_file).replace('.csv', '')))
+            out.write(b',\n  "columns": ' + encode(columns))
+            out.write(b',\n  "data": [')
+            for row in reader:
+                record = {column: parse_value(text, kind) for column, kind, text in zip(columns, types, row)}
+                out.write((b',\n    ' if row_count else b'\n    ') + encode(record))
+                row_count += 1
+            out.write((b'\n  ]' if row_count else b']') + b',\n  "row_count": ' + encode(row_count) + b'\n}\n')
         
-        with open(json_file, 'w') as f:
-            json.dump(result, f, indent=2, default=str)
-        
-        print(f"  ✓ Exported {len(data)} rows to {json_file}")
+        print(f"  ✓ Exported {row_count} rows to {json_file}")
         return True
     except Exception as e:
         print(f"  ✗ Failed to export {csv_file}: {e}")
@@ -57,15 +119,12 @@ def main():
     
     print(f"\nFound {len(csv_files)} CSV files to convert\n")
     
-    success_count = 0
-    for csv_file in sorted(csv_files):
-        csv_path = os.path.join(OUTPUT_DIR, csv_file)
-        json_file = csv_file.replace('.csv', '.json')
-        json_path = os.path.join(JSON_DIR, json_file)
-        
-        print(f"Converting: {csv_file}")
-        if export_csv_to_json(csv_path, json_path):
-            success_count += 1
+    csv_paths = [OUTPUT_DIR / csv_file for csv_file in sorted(csv_files)]
+    json_paths = [JSON_DIR / csv_file.replace('.csv', '.json') for csv_file in sorted(csv_files)]
+    
+    # Each file is parsed and encoded in its own worker process (the files are independent)
+    with ProcessPoolExecutor(max_workers=min(len(csv_paths), os.cpu_count() or 1)) as executor:
+        success_count = sum(executor.map(export_csv_to_json, csv_paths, json_paths))
     
     print("\n" + "=" * 80)
     print(f"EXPORT COMPLETE: {success_count}/{len(csv_files)} files converted")
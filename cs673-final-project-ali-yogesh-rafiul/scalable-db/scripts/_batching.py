@@ -0,0 +1,228 @@
+"""
+Batch Runner
+Runs UNWIND batches against Neo4j (shared by the node and relationship loaders)
+"""
+import base64
+import http.client
+import json
+import math
+import select
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import pandas as pd
+from neo4j.exceptions import Neo4jError, TransientError
+
+try:
+    import orjson
+except ImportError:
+    # Fall back to the standard library encoder if orjson is not installed
+    orjson = None
+
+# One keep-alive HTTP connection per worker thread (NEO4J_HTTP_BULK mode)
+_http = threading.local()
+
+def run_batch(run, records):
+    """
+    Run one UNWIND batch with run(records), returning the number of records loaded
+    A batch that still fails with a transient error (e.g. the transaction running
+    out of memory) is rolled back, so it is split in half and each half retried.
+    """
+    size = batch_length(records)
+    try:
+        run(records)
+        return size
+    except TransientError as e:
+        if size <= 1:
+            raise
+        half = size // 2
+        print(f"  ⚠ Transient error on a batch of {size}, retrying in halves: {e}")
+        return run_batch(run, slice_batch(records, 0, half)) + run_batch(run, slice_batch(records, half, size))
+
+def write_batch(tx, cypher, records):
+    """Transaction function for one UNWIND batch (retried by the driver on transient errors such as deadlocks)"""
+    tx.run(cypher, records=records).consume()
+
+def http_connection(config):
+    """Return this thread's keep-alive connection to the Neo4j HTTP endpoint"""
+    connection = getattr(_http, 'connection', None)
+    if connection is None:
+        parts = urlsplit(config['http_uri'])
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(parts.hostname, parts.port, timeout=config['query_timeout'])
+        _http.connection = connection
+    return connection
+
+def is_stale(connection):
+    """
+    True if the server has closed this idle keep-alive connection
+    An idle socket only turns readable once the peer has closed it (or sent
+    something unexpected), so it is checked before sending, not after a failure.
+    """
+    if connection.sock is None:
+        return False
+    readable, _, _ = select.select([connection.sock], [], [], 0)
+    return bool(readable)
+
+def without_nan(records):
+    """A batch with non-finite floats (NaN for missing values) as None, for the standard JSON encoder"""
+    def clean(value):
+        return None if isinstance(value, float) and not math.isfinite(value) else value
+    if isinstance(records, dict):
+        return {col: [clean(value) for value in values] for col, values in records.items()}
+    return [{key: clean(value) for key, value in record.items()} for record in records]
+
+def run_http_batch(config, cypher, records):
+    """Run one UNWIND statement through the HTTP transactional endpoint (begin and commit in one request)"""
+    path = f"{urlsplit(config['http_uri']).path.rstrip('/')}/db/{config['database']}/tx/commit"
+    credentials = base64.b64encode(f"{config['user']}:{config['password']}".encode()).decode()
+    headers = {
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+        "Authorization": f"Basic {credentials}"
+    }
+    if orjson is not None:
+        # Much faster on large batches, and numpy scalars and NaN (as null) encode directly
+        payload = {"statements": [{"statement": cypher, "parameters": {"records": records}}]}
+        body = orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        payload = {"statements": [{"statement": cypher, "parameters": {"records": without_nan(records)}}]}
+        body = json.dumps(payload, allow_nan=False)
+    
+    connection = http_connection(config)
+    if is_stale(connection):
+        # The server closed the idle keep-alive connection - reconnect before sending
+        connection.close()
+    try:
+        connection.request("POST", path, body=body, headers=headers)
+        response = connection.getresponse()
+        payload = response.read()
+    except (http.client.HTTPException, OSError):
+        # The statement may already have been committed, so it is not sent again
+        # (CREATE is not idempotent); the next batch starts on a fresh connection
+        connection.close()
+        raise
+    
+    if response.status >= 400:
+        raise Neo4jError(f"HTTP {response.status}: {payload[:200].decode(errors='replace')}")
+    errors = json.loads(payload).get("errors", [])
+    if errors:
+        code = errors[0].get("code", "")
+        error_class = TransientError if code.startswith("Neo.TransientError") else Neo4jError
+        raise error_class(f"{code}: {errors[0].get('message', '')}")
+
+def chunk_rows(config):
+    """Rows to read from a processed file at a time - one batch for each worker"""
+    return config['batch_size'] * max(1, config['load_workers'])
+
+def batch_length(records):
+    """Number of rows in a batch (a list of records, or a dict of column lists)"""
+    if isinstance(records, dict):
+        return len(next(iter(records.values()), []))
+    return len(records)
+
+def slice_batch(records, start, stop):
+    """Rows start:stop of a batch, keeping its layout"""
+    if isinstance(records, dict):
+        return {col: values[start:stop] for col, values in records.items()}
+    return records[start:stop]
+
+def split_batches(records, batch_size):
+    """Split a batch into consecutive slices of at most batch_size records"""
+    size = batch_length(records)
+    return [slice_batch(records, i, i + batch_size) for i in range(0, size, batch_size)]
+
+def to_payload(df, columnar=False):
+    """Convert a frame to batch rows: a list of records, or one list per column when columnar"""
+    if columnar:
+        return {col: df[col].tolist() for col in df.columns}
+    return df.to_dict('records')
+
+def columnar_cypher(cypher, columns):
+    """
+    Rewrite an UNWIND $records statement to take one list per column
+    Each row is rebuilt as a map in Cypher, so the rest of the statement still
+    reads record.<column> - but property names are sent once per batch, not per row.
+    """
+    fields = ", ".join(f"`{col}`: $records.`{col}`[i]" for col in columns)
+    rows = f"UNWIND range(0, size($records.`{columns[0]}`) - 1) AS i WITH {{{fields}}} AS record"
+    return cypher.replace("UNWIND $records AS record", rows, 1)
+
+def load_batches(driver, config, df, cypher, kind, batch_size=None, partition_column=None,
+                 order_column=None, auto_commit=False):
+    """
+    Load a DataFrame in UNWIND batches on a pool of worker sessions, returning the rows loaded
+    Without partition_column every batch is an independent task. With it, rows are
+    hash-partitioned on that column and each worker loads one partition in order, so
+    concurrent batches never lock the same node on that side of a relationship.
+    order_column sorts each partition so nodes on the other side, which partitions
+    can still share, are locked in the same order by every worker (no deadlock cycles).
+    auto_commit runs the statements outside a managed transaction over Bolt, as
+    CALL ... IN TRANSACTIONS requires. Those batches are not retried: their inner
+    transactions may already have committed part of the rows.
+    With columnar_payload set, batches are sent as one list per column.
+    """
+    batch_size = batch_size or config['batch_size']
+    workers = max(1, config['load_workers'])
+    columnar = config.get('columnar_payload', False)
+    if columnar:
+        cypher = columnar_cypher(cypher, list(df.columns))
+    
+    # Convert to records once per partition and slice the list, rather than
+    # slicing the frame and boxing every batch's values separately
+    if partition_column is not None and workers > 1:
+        buckets = pd.util.hash_pandas_object(df[partition_column], index=False).to_numpy() % workers
+        partitions = []
+        for i in range(workers):
+            part = df[buckets == i]
+            if order_column is not None:
+                part = part.sort_values(order_column, kind='stable')
+            partitions.append(split_batches(to_payload(part, columnar), batch_size))
+    else:
+        partitions = [[batch] for batch in split_batches(to_payload(df, columnar), batch_size)]
+    
+    # Number the batches up front so error lines stay meaningful across workers
+    tasks = []
+    num_batches = 0
+    for batches in partitions:
+        if batches:
+            tasks.append([(num_batches + i + 1, batch) for i, batch in enumerate(batches)])
+            num_batches += len(batches)
+    
+    # Temporal values have no JSON form in the HTTP API (they would be stored as strings),
+    # so frames with datetime columns always go through Bolt
+    use_http = config['use_http_bulk'] and not auto_commit and df.select_dtypes('datetime').empty
+    
+    def run_batches(run, batches):
+        loaded = 0
+        for batch_num, records in batches:
+            # Progress is reported once per chunk by the caller; only failures are printed here
+            try:
+                if auto_commit:
+                    run(records)
+                    loaded += batch_length(records)
+                else:
+                    loaded += run_batch(run, records)
+            except Exception as e:
+                print(f"  ✗ Error loading {kind} batch {batch_num}/{num_batches}: {e}")
+                # Try to continue with next batch
+                continue
+        return loaded
+    
+    def load_task(batches):
+        if use_http:
+            return run_batches(lambda records: run_http_batch(config, cypher, records), batches)
+        # Sessions are not thread safe, so each task opens its own
+        with driver.session(database=config['database']) as session:
+            if auto_commit:
+                return run_batches(lambda records: session.run(cypher, records=records).consume(), batches)
+            return run_batches(lambda records: session.execute_write(write_batch, cypher, records), batches)
+    
+    total_loaded = 0
+    with ThreadPoolExecutor(max_workers=min(workers, len(tasks)) or 1) as executor:
+        futures = [executor.submit(load_task, batches) for batches in tasks]
+        for future in as_completed(futures):
+            total_loaded += future.result()
+    
+    return total_loaded
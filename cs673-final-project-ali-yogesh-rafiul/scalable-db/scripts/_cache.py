@@ -0,0 +1,53 @@
+"""
+Result Cache
+Keeps statistics and aggregation results on disk between runs (shared by the report scripts)
+"""
+import hashlib
+import json
+import os
+
+from scripts._paths import CACHE_DIR
+
+def graph_version(driver, config):
+    """
+    The ID of the database's last committed transaction, which changes with every write
+    Returns None (nothing is cached) if the cache is off or the server does not report it.
+    """
+    if not config['result_cache']:
+        return None
+    try:
+        with driver.session(database="system") as session:
+            record = session.run(
+                "SHOW DATABASE $db_name YIELD name, lastCommittedTxn RETURN lastCommittedTxn",
+                db_name=config['database']
+            ).single()
+    except Exception as e:
+        print(f"  ⚠ Could not read the last transaction ID, results will not be cached: {e}")
+        return None
+    return record['lastCommittedTxn'] if record else None
+
+def cache_path(cypher):
+    """Cache file for a query (named by the hash of its text)"""
+    return CACHE_DIR / f"{hashlib.sha1(cypher.encode('utf-8')).hexdigest()}.json"
+
+def load_cached(cypher, version):
+    """A query's saved result if it was saved at this graph version, otherwise None"""
+    if version is None:
+        return None
+    try:
+        with open(cache_path(cypher)) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return entry['value'] if entry.get('version') == version else None
+
+def save_cached(cypher, version, value):
+    """Save a query's result (any JSON value) for the given graph version, replacing the old one"""
+    if version is None:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = cache_path(cypher)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': version, 'value': value}, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,29 @@
+"""
+Neo4j Driver
+One driver (and connection pool) per process, shared by the pipeline scripts
+"""
+import atexit
+from neo4j import GraphDatabase
+
+_driver = None
+
+def get_driver(config):
+    """
+    Return the process's Neo4j driver, creating it (and checking connectivity) on first use
+    Scripts run in-process by the pipeline runner reuse it and its warm connections instead
+    of reconnecting; it is closed when the interpreter exits, so scripts don't close it.
+    """
+    global _driver
+    if _driver is None:
+        driver = GraphDatabase.driver(
+            config["uri"],
+            auth=(config["user"], config["password"]),
+            connection_timeout=config["connection_timeout"],
+            max_connection_pool_size=config["max_connection_pool_size"],
+            connection_acquisition_timeout=config["connection_acquisition_timeout"],
+            keep_alive=True
+        )
+        driver.verify_connectivity()
+        atexit.register(driver.close)
+        _driver = driver
+    return _driver
@@ -0,0 +1,40 @@
+"""
+Index Setup
+Creates the single-property indexes a script relies on (shared by the loaders, queries and aggregations)
+"""
+
+def ensure_indexes(driver, config, indexes, kind):
+    """
+    Create any missing index on the given (label, property) pairs and wait for it to come online
+    New indexes are named {label}_{property}_{kind}; a property that already has an index
+    (e.g. one backing a uniqueness constraint) is left alone.
+    """
+    print(f"Checking {kind} indexes...")
+    
+    with driver.session(database=config['database']) as session:
+        try:
+            indexed = {(record['labelsOrTypes'][0], record['properties'][0])
+                       for record in session.run("SHOW INDEXES YIELD labelsOrTypes, properties")
+                       if record['labelsOrTypes'] and record['properties']}
+        except Exception:
+            # If SHOW INDEXES fails, fall back to CREATE INDEX ... IF NOT EXISTS for all of them
+            indexed = set()
+        
+        for label, prop in indexes:
+            if (label, prop) in indexed:
+                continue
+            try:
+                session.run(f"""
+                CREATE INDEX {label.lower()}_{prop.lower()}_{kind} IF NOT EXISTS
+                FOR (n:{label}) ON (n.{prop})
+                """).consume()
+                print(f"  ✓ Created index on {label}.{prop}")
+            except Exception as e:
+                print(f"  ⚠ Could not create index on {label}.{prop}: {e}")
+        
+        # Populate any new index before anything is matched (or timed) against it
+        try:
+            session.run("CALL db.awaitIndexes($timeout)", timeout=config['query_timeout']).consume()
+            print(f"  ✓ {kind.capitalize()} indexes online")
+        except Exception as e:
+            print(f"  ⚠ Could not wait for indexes: {e}")
@@ -0,0 +1,96 @@
+"""
+Processed Data Reader
+Reads the files written by the transformation step (shared by the Neo4j loaders)
+"""
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from pyarrow import csv as pacsv
+except ImportError:
+    # Fall back to pandas' readers if pyarrow is not installed
+    pa = None
+    pq = None
+    pacsv = None
+
+from scripts._paths import PROCESSED_DATA_DIR
+
+# Node keys and relationship endpoints - always text, whatever a CSV chunk looks like
+ID_COLUMNS = ['id', 'code', 'claim_id', 'provider_id', 'beneficiary_id', 'physician_id']
+# Beneficiary State/County codes, text like their 'UNKNOWN' placeholder
+TEXT_COLUMNS = ID_COLUMNS + ['State', 'County']
+
+def decode_categories(df):
+    """Decode categorical columns to their values (rows are turned into plain records for Neo4j)"""
+    for col in df.select_dtypes('category').columns:
+        df[col] = df[col].astype(object)
+    return df
+
+def format_dates(values, date_format='%Y-%m-%d %H:%M:%S'):
+    """Format a datetime Series as strings, formatting each distinct date once (missing dates stay NaN)"""
+    codes, uniques = pd.factorize(values)
+    formatted = uniques.strftime(date_format).to_numpy(dtype=object)
+    return pd.Series(pd.api.extensions.take(formatted, codes, allow_fill=True), index=values.index)
+
+def to_plain_values(df):
+    """
+    Turn a frame into plain Python values for Neo4j in one vectorized pass
+    Dates become strings, missing values None and numpy scalars Python ints/floats.
+    """
+    for col in df.select_dtypes('datetime').columns:
+        df[col] = format_dates(df[col])
+    return df.astype(object).where(df.notna(), None)
+
+def iter_csv_chunks(csv_path, chunk_rows, columns=None):
+    """
+    Parse a CSV file with the multithreaded Arrow reader and yield it in chunks
+    Types are inferred over the whole file (a streaming reader freezes them after the
+    first block, which breaks on columns that are empty early on), and each slice is
+    converted to pandas only when it is loaded.
+    """
+    table = pacsv.read_csv(
+        csv_path,
+        convert_options=pacsv.ConvertOptions(
+            column_types={col: pa.string() for col in TEXT_COLUMNS},
+            strings_can_be_null=True,
+            include_columns=columns
+        )
+    )
+    for offset in range(0, table.num_rows, chunk_rows):
+        yield table.slice(offset, chunk_rows).to_pandas()
+
+def present_columns(columns, available):
+    """The requested columns that the file has, in file order (None reads every column)"""
+    if columns is None:
+        return None
+    return [col for col in available if col in columns]
+
+def iter_processed(basename, chunk_rows, columns=None):
+    """
+    Read a processed data file in chunks of chunk_rows, preferring Parquet over CSV
+    Only the given columns are parsed (those missing from the file are skipped).
+    Returns an iterator of DataFrames, or None if neither file exists.
+    """
+    parquet_path = PROCESSED_DATA_DIR / f"{basename}.parquet"
+    csv_path = PROCESSED_DATA_DIR / f"{basename}.csv"
+
+    if parquet_path.exists():
+        if pq is None:
+            df = pd.read_parquet(parquet_path)
+            return iter([decode_categories(df[present_columns(columns, df.columns) or df.columns])])
+        parquet_file = pq.ParquetFile(parquet_path)
+        columns = present_columns(columns, parquet_file.schema_arrow.names)
+        batches = parquet_file.iter_batches(batch_size=chunk_rows, columns=columns)
+        return (decode_categories(batch.to_pandas()) for batch in batches)
+
+    if csv_path.exists():
+        columns = present_columns(columns, pd.read_csv(csv_path, nrows=0).columns)
+        if pacsv is not None:
+            return iter_csv_chunks(csv_path, chunk_rows, columns)
+        # Each chunk infers its own types, so pin the key and location columns (e.g. all-numeric codes) to text
+        return pd.read_csv(csv_path, chunksize=chunk_rows, usecols=columns,
+                           dtype={col: str for col in TEXT_COLUMNS})
+
+    print(f"  File not found: {parquet_path} (or {csv_path.name})")
+    return None
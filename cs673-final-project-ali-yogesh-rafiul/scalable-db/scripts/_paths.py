@@ -0,0 +1,15 @@
+"""
+Project Paths
+Data and output directories shared by all pipeline scripts (resolved once per process)
+"""
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+RAW_DATA_DIR = BASE_DIR / "data" / "raw"
+PROCESSED_DATA_DIR = BASE_DIR / "data" / "processed"
+STATS_DIR = BASE_DIR / "data" / "stats"
+CACHE_DIR = STATS_DIR / ".cache"
+RESULTS_DIR = BASE_DIR / "outputs" / "results"
+JSON_DIR = RESULTS_DIR / "json"
+QUERIES_DIR = BASE_DIR / "queries"
@@ -0,0 +1,59 @@
+"""
+Pipeline Runner Helper
+Runs a pipeline script either in-process or in its own interpreter
+(shared by run_pipeline.py and run_reports.py)
+"""
+import os
+import sys
+import importlib
+import subprocess
+
+# Import the heavy dependencies once up front so every in-process stage reuses them
+import pandas
+import neo4j
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def run_script(script_name, description, context=None, *, inprocess=True):
+    """Run a pipeline script in-process (or in its own interpreter with inprocess=False) and handle errors"""
+    print("\n" + "=" * 80)
+    print(f"Running: {description}")
+    print("=" * 80)
+    
+    script_path = os.path.join(SCRIPTS_DIR, script_name)
+    
+    if not os.path.exists(script_path):
+        print(f"✗ Script not found: {script_path}")
+        return False
+    
+    if not inprocess:
+        try:
+            subprocess.run(
+                [sys.executable, script_path],
+                check=True,
+                capture_output=False
+            )
+            print(f"✓ {description} completed successfully")
+            return True
+        except subprocess.CalledProcessError as e:
+            print(f"✗ {description} failed with exit code {e.returncode}")
+            return False
+        except Exception as e:
+            print(f"✗ {description} failed: {e}")
+            return False
+    
+    # In-process: imports are paid once and DataFrames are shared through context
+    try:
+        module = importlib.import_module(f"scripts.{os.path.splitext(script_name)[0]}")
+        module.main(context)
+        print(f"✓ {description} completed successfully")
+        return True
+    except SystemExit as e:
+        if e.code in (None, 0):
+            print(f"✓ {description} completed successfully")
+            return True
+        print(f"✗ {description} failed with exit code {e.code}")
+        return False
+    except Exception as e:
+        print(f"✗ {description} failed: {e}")
+        return False
@@ -4,18 +4,73 @@ Downloads the healthcare fraud detection dataset from Kaggle
 """
 import os
 import sys
+import json
+import hashlib
+import argparse
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from kaggle.api.kaggle_api_extended import KaggleApi
 
-# Define paths
-RAW_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "raw")
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts._paths import RAW_DATA_DIR
 os.makedirs(RAW_DATA_DIR, exist_ok=True)
 
-def download_dataset():
-    """Download dataset from Kaggle"""
+# Dataset files downloaded at once, each over its own connection
+DOWNLOAD_WORKERS = 8
+
+# MD5 of every extracted CSV, written after a download and checked before the next one
+MANIFEST_PATH = RAW_DATA_DIR / ".manifest.json"
+
+def file_md5(path):
+    """MD5 of a file, read in 1 MB blocks"""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def dataset_is_current():
+    """Whether every file in the manifest is still in RAW_DATA_DIR, unchanged"""
+    try:
+        with open(MANIFEST_PATH) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return bool(manifest) and all(
+        (RAW_DATA_DIR / name).exists() and file_md5(RAW_DATA_DIR / name) == md5
+        for name, md5 in manifest.items()
+    )
+
+def write_manifest():
+    """Record the MD5 of every CSV in RAW_DATA_DIR"""
+    manifest = {name: file_md5(RAW_DATA_DIR / name)
+                for name in sorted(os.listdir(RAW_DATA_DIR)) if name.endswith('.csv')}
+    with open(MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+def download_file(api, dataset, file_name):
+    """Download one dataset file, unzipping it in place if Kaggle sends it compressed"""
+    api.dataset_download_file(dataset, file_name, path=str(RAW_DATA_DIR), force=True, quiet=True)
+    zip_path = RAW_DATA_DIR / f"{file_name}.zip"
+    if zip_path.exists():
+        with zipfile.ZipFile(zip_path) as archive:
+            archive.extractall(RAW_DATA_DIR)
+        os.remove(zip_path)
+    return file_name
+
+def download_dataset(force=False):
+    """Download dataset from Kaggle (skipped if the extracted files match the manifest, unless force)"""
     print("=" * 80)
     print("KAGGLE DATASET DOWNLOAD")
     print("=" * 80)
     
+    if not force and dataset_is_current():
+        print(f"✓ Dataset already downloaded (files in {RAW_DATA_DIR} match {MANIFEST_PATH.name})")
+        print("  Use --force to download it again")
+        return True
+    
     # Initialize Kaggle API
     try:
         api = KaggleApi()
@@ -35,19 +90,31 @@ def download_dataset():
     print(f"Destination: {RAW_DATA_DIR}")
     
     try:
-        # Download dataset files
-        api.dataset_download_files(
-            dataset,
-            path=RAW_DATA_DIR,
-            unzip=True
-        )
+        # Download the files side by side (each is unzipped as soon as it arrives),
+        # or the whole archive in one piece if they can't be listed
+        try:
+            files = api.dataset_list_files(dataset).files
+        except Exception as e:
+            print(f"⚠ Could not list the dataset files, downloading the archive instead: {e}")
+            files = []
+        if files:
+            with ThreadPoolExecutor(max_workers=min(len(files), DOWNLOAD_WORKERS)) as executor:
+                for file_name in executor.map(lambda f: download_file(api, dataset, f.ref), files):
+                    print(f"  ✓ {file_name}")
+        else:
+            api.dataset_download_files(
+                dataset,
+                path=str(RAW_DATA_DIR),
+                unzip=True
+            )
         print("✓ Dataset downloaded and extracted successfully")
+        write_manifest()
         
         # List downloaded files
         print("\nDownloaded files:")
         for file in os.listdir(RAW_DATA_DIR):
             if file.endswith('.csv'):
-                filepath = os.path.join(RAW_DATA_DIR, file)
+                filepath = RAW_DATA_DIR / file
                 size = os.path.getsize(filepath) / (1024 * 1024)  # Size in MB
                 print(f"  {file} ({size:.2f} MB)")
         
@@ -57,7 +124,17 @@ def download_dataset():
         print(f"✗ Failed to download dataset: {e}")
         return False
 
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="download the dataset even if the extracted files are unchanged"
+    )
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    success = download_dataset()
+    success = download_dataset(force=parse_args().force)
     sys.exit(0 if success else 1)
 